@@ -1,103 +1,81 @@
-import json
 import os
 from scipy.optimize import minimize
 from qiskit import QuantumCircuit, Aer
 from qiskit.circuit import Parameter
 import time
 import math
+from instance import load_instance, instance_exists, as_group_index
+from objective import evaluate_counts, get_objective_cache
+from qaoa_circuit import get_qaoa_template, bind_qaoa_circ
+from expectation import get_statevector_expectation, get_numpy_expectation
 
 
 # JSONファイルをインプットする
 def ImportImputJSON(fileName):    
-    columns_path = os.path.join('json', fileName, 'columns.json')
-    table_path = os.path.join('json', fileName, 'Table.json')
-
-    if not os.path.exists(columns_path) or not os.path.exists(table_path):
+    directory = os.path.join('json', fileName)
+    if not instance_exists(directory):
         print("Error: Files not found.")
         return None, None
-    
-    with open(columns_path) as f:
-        columns = json.load(f)
 
-    with open(table_path) as f:
-        Table = json.load(f)
-
-    return columns, Table
+    # 2回目からはjson/<name>/instance.npzを読むだけで済む
+    return load_instance(directory)
 
 # TTSを得る
 def time_to_solution(tau, feasible_rate, target_probability):
     if feasible_rate == 1:
         time = tau
+    # 実行可能解が一つも出なかった場合は何回繰り返しても届かないとみなす
+    elif feasible_rate == 0:
+        time = math.inf
     else:
         time = tau * math.ceil(math.log(1-target_probability)/math.log(1-feasible_rate))
     return time
 
 # 問題の目的関数を定義する
+# Qiskitのビット列を受け取るので、右端のビットを0番目の変数として扱う
 def blackbox_obj(solution, columns, Gce):
-    solution_array = list(map(int, solution))
-
-    obj = 0
-    
-    # 目的関数の計算
-    for i in range(len(Gce)):
-        note = 0
-        for j in range(len(Gce[0])):
-            note += (Gce[i][j] * solution_array[j])
-            obj += ((note-1)**2)
-    return obj
+    objectives, _, _ = evaluate_counts({solution: 1}, Gce)
+    return int(objectives[0])
 
 # あるビット列bit_stringの目的関数の値を入手し、shot分まわすことで期待値を求める
+# countsをまとめて評価するので、ビット列ごとにblackbox_objを呼ばない
+# 一度評価したビット列の値は問題ごとのキャッシュから取り出す
 def compute_expectation(counts, columns, Gce):
-    avg = 0
-    sum_count = 0
-    for bit_string, count in counts.items():
-        obj = blackbox_obj(bit_string, columns, Gce)
-        avg += obj * count
-        sum_count += count
-    return avg/sum_count
+    _, expectation, _ = evaluate_counts(counts, Gce, get_objective_cache(Gce))
+    return expectation
 
 # 量子回路の作成
-def create_qaoa_circ(columns, Gce, theta):
+def create_qaoa_circ(columns, Gce, theta, backend=None):
+    if backend is None:
+        backend = Aer.get_backend('qasm_simulator')
     # 量子ビットはXeの部分に落とし込む
-    nqubits = len(Gce[0])
-    n_layers = len(theta)//2
-    beta = theta[:n_layers]
-    gamma = theta[n_layers:]
-    
-    qc = QuantumCircuit(nqubits)
-    qc.h(range(nqubits))
-
-    # |γ, β>のところ
-    for layer_index in range(n_layers):
-        for pair in list(columns):
-            qc.rzz(gamma[layer_index], pair[0], pair[1])
-        for qubit in range(nqubits):
-            qc.rx(2 * beta[layer_index], qubit)
-        
-    qc.measure_all()
-    return qc
+    # β、γをシンボルにした回路をトランスパイル済みで使い回し、値だけ代入する
+    template = get_qaoa_template(columns, as_group_index(Gce).num_vars, len(theta)//2, backend)
+    return bind_qaoa_circ(template, theta)
+
+# 期待値を得る(shots=512なので512回ずつ実行する)
+# method='statevector'の場合はサンプリングせず状態ベクトルから厳密に求める
+# method='numpy'の場合はAerを使わずQAOA専用のシミュレータで求める
+def get_expectation(columns, Gce, shots=512, method='qasm'):
+    if method == 'statevector':
+        return get_statevector_expectation(columns, Gce)
+    if method == 'numpy':
+        return get_numpy_expectation(columns, Gce)
 
-# 期待値を得る(shots=512なので512回ずつ実行する(?))
-def get_expectation(columns, Gce, shots=512):
     backend = Aer.get_backend('qasm_simulator')
-    backend.shots = shots
     
-    # 回路を実行する
+    # 回路を実行する(ショット数はbackend.shotsではなくrunに渡す)
     def execute_circ(theta):
-        qc = create_qaoa_circ(columns, Gce, theta)
-        counts = backend.run(qc).result().get_counts()
+        qc = create_qaoa_circ(columns, Gce, theta, backend)
+        counts = backend.run(qc, shots=shots).result().get_counts()
         return compute_expectation(counts, columns, Gce)
     
     return execute_circ
 
 # JSONファイルをインポートして、columnをつくる(columnsは使わない)
 columns, Gce = ImportImputJSON('ChengRW100')
-column = []
 # columnはGceの横に見た際のどこに1があるかを示すタプル
-for i, row in enumerate(Gce):
-    indices = [idx for idx, val in enumerate(row) if val == 1]
-    if len(indices) == 2:
-        column.append((indices[0], indices[1]))
+column = Gce.pairs()
 
 # 前までのコードで期待値を得るものをexpectationに格納しておく
 expectation = get_expectation(column, Gce)
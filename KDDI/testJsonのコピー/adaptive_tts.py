@@ -0,0 +1,92 @@
+import math
+
+
+# TTSを報告する目標確率 (QAOA_evaluation.pyと同じ3つ)
+TARGET_PROBABILITIES = [0.99, 0.999, 0.9999]
+
+# 結果の辞書のキー 0.99 -> 'TTS', 0.999 -> 'TTS_999', 0.9999 -> 'TTS_9999'
+def tts_key(target):
+    if target == 0.99:
+        return 'TTS'
+    return 'TTS_' + f'{target}'.split('.')[1]
+
+# 1回あたりの時間tauと成功確率pから、target以上の確率で一度は成功するまでの時間
+# p = 0 の場合は何回繰り返しても届かないのでinf
+def tts(tau, p, target):
+    if p >= 1:
+        return tau
+    if p <= 0:
+        return math.inf
+    return tau * math.ceil(math.log1p(-target)/math.log1p(-p))
+
+# 成功回数/試行回数に対する成功確率のWilsonスコア区間 (zは1.96で95%)
+# 0回や全部成功の場合でも幅のある区間になるので、log(1-0)のような退化が起きない
+def wilson_interval(successes, trials, z=1.96):
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes/trials
+    denominator = 1 + z**2/trials
+    center = (p + z**2/(2*trials))/denominator
+    half = z*math.sqrt(p*(1-p)/trials + z**2/(4*trials**2))/denominator
+    #端では丸め誤差で0や1からずれるので、そのまま0と1にする
+    low = 0.0 if successes == 0 else max(0.0, center - half)
+    high = 1.0 if successes == trials else min(1.0, center + half)
+    return low, high
+
+# 打ち切りの判定に使う、繰り返し回数を切り上げない(連続な)TTS 1回未満にはならない
+def _continuous_tts(tau, p, target):
+    if p >= 1:
+        return tau
+    if p <= 0:
+        return math.inf
+    return tau * max(1.0, math.log1p(-target)/math.log1p(-p))
+
+# sample_chunk(n, k) で n回分(k番目のまとまり)をサンプルし (実行可能解の数, 実際に得たサンプル数, かかった時間) を受け取る
+# 成功確率の信頼区間から求めたtargetでのTTSの区間の幅が、推定値のprecision倍以下になったら止める
+# 簡単な問題は少ない回数で止まり、難しい問題はmax_samplesまで回数を増やす
+# 結果にはtargetsの全ての目標確率でのTTSとその区間を入れる
+def adaptive_tts(sample_chunk, chunk=100, precision=0.2, target=0.99, targets=TARGET_PROBABILITIES, z=1.96, min_samples=None, max_samples=100000):
+    if min_samples is None:
+        min_samples = chunk
+
+    samples = 0
+    feasible = 0
+    elapsed = 0.0
+    k = 0
+    while True:
+        n = min(chunk, max_samples - samples)
+        chunk_feasible, chunk_samples, chunk_time = sample_chunk(n, k)
+        samples += chunk_samples
+        feasible += chunk_feasible
+        elapsed += chunk_time
+        k += 1
+
+        tau = elapsed/samples
+        low, high = wilson_interval(feasible, samples, z)
+        estimate = feasible/samples
+        converged = _within_precision(tau, estimate, low, high, target, precision)
+        if samples >= max_samples or (samples >= min_samples and converged):
+            break
+
+    result = {
+        'samples': samples,
+        'chunks': k,
+        'tau': tau,
+        'feasibleRate': estimate,
+        'feasibleRate_low': low,
+        'feasibleRate_high': high,
+        'converged': converged,
+    }
+    for probability in targets:
+        key = tts_key(probability)
+        result[key] = tts(tau, estimate, probability)
+        # 成功確率が大きいほどTTSは小さいので、区間の端は入れ替わる
+        result[key + '_low'] = tts(tau, high, probability)
+        result[key + '_high'] = tts(tau, low, probability)
+    return result
+
+def _within_precision(tau, estimate, low, high, target, precision):
+    upper = _continuous_tts(tau, low, target)
+    if math.isinf(upper):
+        return False
+    return upper - _continuous_tts(tau, high, target) <= precision * _continuous_tts(tau, estimate, target)
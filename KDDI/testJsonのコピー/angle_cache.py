@@ -0,0 +1,67 @@
+import json
+import os
+import numpy as np
+
+
+# 問題(Gce)を一意に表す文字列
+def instance_fingerprint(Gce):
+    return Gce.fingerprint()
+
+# pレイヤーのアングルからp+1レイヤーの初期値を線形補間で作る(INTERP)
+# β、γそれぞれについて new[i] = i/p * old[i-1] + (p-i)/p * old[i] (i = 0..p)
+def interpolate_angles(theta):
+    p = len(theta)//2
+
+    def interp(angles):
+        padded = np.concatenate([[0.0], angles, [0.0]])
+        i = np.arange(p + 1)
+        return i/p * padded[i] + (p - i)/p * padded[i + 1]
+
+    theta = np.asarray(theta, dtype=np.float64)
+    return np.concatenate([interp(theta[:p]), interp(theta[p:])])
+
+# 問題とレイヤー数ごとに、これまでで最も期待値の小さかったアングルをJSONに保存しておく
+class AngleCache:
+
+    def __init__(self, path='output/angle_cache.json'):
+        self.path = path
+        self.table = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.table = json.load(f)
+
+    def get(self, fingerprint, n_layers):
+        entry = self.table.get(fingerprint, {}).get(str(n_layers))
+        if entry is None:
+            return None
+        return np.array(entry['theta']), entry['fun']
+
+    # 期待値が今までより小さい場合だけ更新する
+    def update(self, fingerprint, n_layers, theta, fun):
+        best = self.get(fingerprint, n_layers)
+        if best is not None and best[1] <= fun:
+            return False
+        self.table.setdefault(fingerprint, {})[str(n_layers)] = {'theta': [float(v) for v in theta], 'fun': float(fun)}
+        return True
+
+    # 同じレイヤー数の最良値、なければp-1レイヤーの最良値を補間したもの、どちらもなければdefault
+    def initial_point(self, fingerprint, n_layers, default=None):
+        best = self.get(fingerprint, n_layers)
+        if best is not None:
+            return best[0]
+        previous = self.get(fingerprint, n_layers - 1) if n_layers > 1 else None
+        if previous is not None:
+            return interpolate_angles(previous[0])
+        if default is None:
+            default = [1.0] * (2 * n_layers)
+        return np.asarray(default, dtype=np.float64)
+
+    # 書きかけのファイルが残らないよう、一時ファイルに書いてから置き換える
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.table, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,223 @@
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qa'))
+from instance import load_instance
+from objective import counts_to_matrix, objective_values
+
+# 計測するフェーズ(実行されないフェーズは0になる)
+PHASES = ['load', 'build', 'transpile', 'sample', 'decode', 'evaluate']
+
+
+# フェーズごとの経過時間[ns]をperf_counter_nsで測る
+class PhaseTimer:
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter_ns() - start
+
+# 結果を比べる時に必要な実行環境の情報
+def environment_metadata():
+    metadata = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    for package in ('qiskit', 'qiskit-aer', 'dimod', 'dwave-neal', 'openjij', 'dwave-system'):
+        try:
+            metadata[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            metadata[package] = None
+    try:
+        metadata['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        metadata['commit'] = None
+    return metadata
+
+# QAOAの1回分: 回路を作ってアングルを代入し、トランスパイルしてサンプルし、ビット列を評価する
+# method='numpy'ならAerの代わりにQAOASimulatorで状態ベクトルからサンプルする(トランスパイルはない)
+# method='mps'なら行列積状態で回路を計算し(build)、そこからサンプルする 切り捨て誤差とボンド次元も残す
+def run_qaoa(directory, config, seed):
+    timer = PhaseTimer()
+    with timer.phase('load'):
+        columns, Gce = load_instance(directory)
+
+    theta = config['theta']
+    n_layers = len(theta)//2
+    pairs = Gce.pairs()
+    outcome = {}
+    if config['method'] == 'mps':
+        from mps_simulator import MPSSimulator
+        simulator = MPSSimulator(pairs, Gce.num_vars, config['max_bond'], config['cutoff'])
+        with timer.phase('build'):
+            simulator.run(theta)
+        with timer.phase('sample'):
+            bits = simulator.sample_bits(config['shots'], seed)
+            occurrences = np.ones(len(bits), dtype=np.int64)
+        outcome = {'truncation_error': simulator.truncation_error, 'bond': simulator.bond}
+    elif config['method'] == 'numpy':
+        from qaoa_simulator import QAOASimulator
+        from objective import cost_vector
+        with timer.phase('build'):
+            simulator = QAOASimulator(pairs, Gce.num_vars, cost_vector(Gce, Gce.num_vars))
+        with timer.phase('sample'):
+            counts = simulator.sample_counts(theta, config['shots'], seed)
+    else:
+        from qiskit import Aer, transpile
+        from qaoa_circuit import build_qaoa_template, bind_qaoa_circ
+        backend = Aer.get_backend('qasm_simulator')
+        with timer.phase('build'):
+            circuit = bind_qaoa_circ(build_qaoa_template(pairs, Gce.num_vars, n_layers), theta)
+        with timer.phase('transpile'):
+            circuit = transpile(circuit, backend)
+        with timer.phase('sample'):
+            counts = backend.run(circuit, seed_simulator=seed, shots=config['shots'], max_parallel_threads=1).result().get_counts()
+
+    if config['method'] != 'mps':
+        with timer.phase('decode'):
+            bits, occurrences = counts_to_matrix(counts, Gce.num_vars)
+    with timer.phase('evaluate'):
+        objectives = objective_values(bits, Gce)
+        feasibleRate = float(occurrences[objectives == 0].sum() / occurrences.sum())
+
+    return timer.phases, {'samples': int(occurrences.sum()), 'feasibleRate': feasibleRate, **outcome}
+
+# アニーリングの1回分: QUBOを作り、登録されたバックエンドでサンプルし、結果を解析する
+# QUBOはキャッシュを通さずに毎回作る(QPUの埋め込みはセッションに残るので、ウォームアップの後は再利用される)
+def run_annealing(directory, config, seed, session=None):
+    from AnnealingEngine import AnnealingInfo, GetBackend
+    from QuboBuilder import BuildQubo
+    from ResultAnalyzer import ResponseMatrix, AnalyzeMatrix
+
+    timer = PhaseTimer()
+    with timer.phase('load'):
+        edges, Group = load_instance(directory)
+
+    parameters = AnnealingInfo(edges, Group, config['engine'])
+    parameters.ChangeParameters(**config['parameters'], seed=seed)
+    #セッションはQPUの埋め込みを使い回すためのもので、QPU以外のバックエンドには渡さない
+    if config['engine'] == 'qpu':
+        parameters.session = session
+    w_selectEdge = parameters.feed_dict['w_selectEdge']
+
+    with timer.phase('build'):
+        qubo, offset = BuildQubo(Group, w_selectEdge)
+    with timer.phase('sample'):
+        response, sampling_time = GetBackend(config['engine'])['sample'](qubo, parameters)
+    with timer.phase('decode'):
+        X, occurrences = ResponseMatrix(response, len(edges))
+    with timer.phase('evaluate'):
+        analysis = AnalyzeMatrix(X, occurrences, Group, w_selectEdge)
+
+    # バックエンドが報告するサンプリング時間(QPUならqpu_sampling_time)も残す
+    return timer.phases, {'samples': analysis['num_samples'], 'feasibleRate': analysis['feasibleRate'],
+                          'reported_sampling_ns': int(sampling_time * 1e6)}
+
+def summarize(runs):
+    summary = {}
+    for name in PHASES:
+        values = np.array([run['phases'][name] for run in runs], dtype=np.int64)
+        summary[name] = {'median_ns': int(np.median(values)), 'min_ns': int(values.min()), 'mean_ns': float(values.mean())}
+    totals = np.array([sum(run['phases'].values()) for run in runs], dtype=np.int64)
+    summary['total'] = {'median_ns': int(np.median(totals)), 'min_ns': int(totals.min()), 'mean_ns': float(totals.mean())}
+    return summary
+
+# warmup回実行して捨ててから、repeat回の計測を行う シードは回ごとにbase_seed + 番号
+def run_benchmark(fileName, config, repeat=10, warmup=2, base_seed=0, session=None):
+    directory = os.path.join('json', fileName)
+    if config['engine'] == 'qaoa':
+        run = lambda seed: run_qaoa(directory, config, seed)
+    else:
+        run = lambda seed: run_annealing(directory, config, seed, session)
+
+    for k in range(warmup):
+        run(base_seed + k)
+
+    runs = []
+    for k in range(repeat):
+        seed = base_seed + warmup + k
+        phases, outcome = run(seed)
+        runs.append({'seed': seed, 'phases': phases, **outcome})
+
+    return {
+        'instance': fileName,
+        'config': config,
+        'repeat': repeat,
+        'warmup': warmup,
+        'environment': environment_metadata(),
+        'summary': summarize(runs),
+        'runs': runs,
+    }
+
+def print_summary(result):
+    print(f"{result['config']['engine']} on {result['instance']} ({result['repeat']} runs, median / min in ms)")
+    for name, row in result['summary'].items():
+        print(f'  {name}'.ljust(13), f"{row['median_ns']/1e6:12.3f} {row['min_ns']/1e6:12.3f}")
+
+# python benchmark.py qaoa ChengRW100 --shots 1024 / python benchmark.py neal twitter10000 --num-reads 100
+if __name__ == "__main__":
+    from AnnealingEngine import BackendNames
+    parser = argparse.ArgumentParser()
+    parser.add_argument('engine', choices=['qaoa'] + BackendNames())
+    parser.add_argument('instance')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    # QAOA
+    parser.add_argument('--method', choices=['qasm', 'numpy', 'mps'], default='qasm')
+    parser.add_argument('--shots', type=int, default=1024)
+    parser.add_argument('--theta', type=float, nargs='+', default=[1.0, 1.0])
+    parser.add_argument('--max-bond', type=int, default=64, help='MPSのボンド次元の上限')
+    parser.add_argument('--cutoff', type=float, default=1e-10, help='MPSで捨てる特異値の重みの上限')
+    # アニーリング
+    parser.add_argument('--num-reads', type=int, default=1000)
+    parser.add_argument('--num-sweeps', type=int, default=100)
+    parser.add_argument('--annealing-time', type=int, default=20)
+    parser.add_argument('--time-limit', type=int, default=1)
+    parser.add_argument('--offline', action='store_true', help='qpuバックエンドをローカルのPegasus構造のSA(neal)で代用する')
+    args = parser.parse_args()
+
+    if args.engine == 'qaoa':
+        config = {'engine': 'qaoa', 'method': args.method, 'shots': args.shots, 'theta': args.theta}
+        if args.method == 'mps':
+            config.update({'max_bond': args.max_bond, 'cutoff': args.cutoff})
+    else:
+        config = {'engine': args.engine, 'parameters': {'num_reads': args.num_reads, 'num_sweeps': args.num_sweeps,
+                                                         'annealing_time': args.annealing_time, 'time_limit': args.time_limit}}
+    session = None
+    if args.offline and args.engine != 'qpu':
+        parser.error('--offline is only available for the qpu backend')
+    if args.offline:
+        from SamplerSession import SamplerSession, LocalStructuredSampler
+        session = SamplerSession(LocalStructuredSampler(), random_seed=args.seed)
+        config['offline'] = True
+
+    result = run_benchmark(args.instance, config, args.repeat, args.warmup, args.seed, session)
+    print_summary(result)
+
+    output = args.output or f"output/benchmark_{args.engine}_{args.instance}.json"
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=1)
+    print(output)
@@ -0,0 +1,190 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qa'))
+from instance import GroupIndex, load_instance
+from objective import counts_to_matrix, objective_values
+from adaptive_tts import TARGET_PROBABILITIES, tts, tts_key
+
+
+# 変数と制約(グループ)の二部グラフを、変数を頂点とするunion-findで連結成分に分ける
+# 同じグループに入っている変数は同じ成分になる どのグループにも入らない変数はどの成分にも入れない
+def find_components(Gce):
+    parent = np.arange(Gce.num_vars)
+
+    def find(v):
+        root = v
+        while parent[root] != root:
+            root = parent[root]
+        while parent[v] != root:
+            parent[v], v = root, parent[v]
+        return root
+
+    for c in range(len(Gce)):
+        variables, _ = Gce.members(c)
+        first = find(variables[0]) if len(variables) > 0 else None
+        for v in variables[1:]:
+            root = find(v)
+            if root != first:
+                parent[root] = first
+
+    roots = np.array([find(v) for v in range(Gce.num_vars)], dtype=np.int64)
+    group_roots = roots[Gce.indices[Gce.indptr[:-1]]] if len(Gce) > 0 else np.zeros(0, dtype=np.int64)
+    # 成分は最初に出てくるグループの順に並べる
+    components = []
+    for root in dict.fromkeys(group_roots.tolist()):
+        components.append((np.flatnonzero(roots == root), np.flatnonzero(group_roots == root)))
+    return components
+
+# 成分(variables, groups)だけを取り出し、変数を0から振り直した部分問題 (columns, GroupIndex) を作る
+def sub_instance(columns, Gce, variables, groups):
+    renumber = np.full(Gce.num_vars, -1, dtype=np.int64)
+    renumber[variables] = np.arange(len(variables))
+
+    indptr = [0]
+    indices = []
+    data = []
+    for c in groups:
+        members, coefficients = Gce.members(c)
+        indices.append(renumber[members])
+        data.append(coefficients)
+        indptr.append(indptr[-1] + len(members))
+    sub_groups = GroupIndex(indptr, np.concatenate(indices), np.concatenate(data), len(variables))
+    return np.asarray(columns)[variables], sub_groups
+
+# 部分問題の解(0/1)を元の変数の位置に戻して一つの解にする どの成分にも入らない変数は0
+def stitch(components, solutions, num_vars):
+    solution = np.zeros(num_vars, dtype=np.uint8)
+    for (variables, _), part in zip(components, solutions):
+        solution[variables] = part
+    return solution
+
+# 部分問題の結果をまとめる
+# 各部分から1回ずつサンプルしたものを全体の1回とみなすと、tauは和、実行可能解の割合は積になる
+# TTSは部分ごとに別々に繰り返す場合のもので、確率1でない部分がk個なら各部分を目標確率 target^(1/k) で解けば
+# 全体がtarget以上の確率で解けるので、その時間の和にする
+# partsは連結成分ごとの結果(同じ解を使い回した成分は同じ結果が成分の数だけ並ぶ)
+def combine_results(parts, targets=TARGET_PROBABILITIES):
+    uncertain = max(1, sum(1 for part in parts if part['feasibleRate'] < 1))
+    combined = {
+        'tau': sum(part['tau'] for part in parts),
+        'feasibleRate': float(np.prod([part['feasibleRate'] for part in parts])),
+    }
+    for target in targets:
+        combined[tts_key(target)] = sum(tts(part['tau'], part['feasibleRate'], target ** (1/uncertain)) for part in parts)
+    return combined
+
+# 連結成分ごとにsolve_part(columns, GroupIndex) で解き、解をつなぎ合わせて結果をまとめる
+# solve_partは 'tau'、'feasibleRate'、'solution'(部分問題の変数の0/1) を含む辞書を返す
+# reuse_identical=Trueなら、同じ形(変数を振り直したGroupIndexが同じ)の部分問題は一度だけ解いて解を使い回す
+# その場合も全体のtau、実行可能解の割合、TTSは成分ごとに数える(解いた回数ではなく成分の数だけ掛け合わせ、足し合わせる)
+def solve_decomposed(columns, Gce, solve_part, reuse_identical=True):
+    components = find_components(Gce)
+    solved = {}
+    parts = []
+    for index, (variables, groups) in enumerate(components):
+        sub_columns, sub_groups = sub_instance(columns, Gce, variables, groups)
+        key = sub_groups.fingerprint() if reuse_identical else index
+        if key not in solved:
+            solved[key] = solve_part(sub_columns, sub_groups)
+        parts.append(solved[key])
+
+    solution = stitch(components, [part['solution'] for part in parts], Gce.num_vars)
+    result = combine_results(parts)
+    result['parts'] = len(solved)
+    result['components'] = len(components)
+    result['largest'] = max((len(variables) for variables, _ in components), default=0)
+    result['solution'] = solution
+    result['objective'] = int(objective_values(solution[np.newaxis, :], Gce)[0])
+    return result
+
+# サンプルの中から目的関数値が最小で、その中で最も多く出た解を選ぶ
+def _best_sample(bits, occurrences, objectives):
+    order = np.lexsort((-occurrences, objectives))
+    return np.asarray(bits[order[0]], dtype=np.uint8)
+
+# QAOAで部分問題を解くsolve_part アングルをevaluation.optimize_anglesで最適化してからshots回サンプルする
+# tauは1ショットあたりの時間[s]
+def qaoa_solver(maximum_iteration=20, shots=1024, method='qasm', x0=(1.0, 1.0), n_layers=1, seed=10):
+    from qiskit import Aer
+    from QAOA import create_qaoa_circ
+    from evaluation import optimize_angles
+
+    backend = Aer.get_backend('qasm_simulator')
+
+    def solve_part(columns, Gce):
+        column = Gce.pairs()
+        res = optimize_angles(column, Gce, maximum_iteration, shots, method, x0, n_layers, seed=seed)
+        qc_res = create_qaoa_circ(column, Gce, res.x, backend)
+        op_time = time.perf_counter()
+        counts = backend.run(qc_res, seed_simulator=seed, shots=shots, max_parallel_threads=1).result().get_counts()
+        ed_time = time.perf_counter()
+
+        bits, occurrences = counts_to_matrix(counts, Gce.num_vars)
+        objectives = objective_values(bits, Gce)
+        return {
+            'qubits': Gce.num_vars,
+            'tau': (ed_time - op_time)/shots,
+            'feasibleRate': float(occurrences[objectives == 0].sum()/occurrences.sum()),
+            'solution': _best_sample(bits, occurrences, objectives),
+            'x': res.x,
+        }
+
+    return solve_part
+
+# アニーリングのバックエンド(qa/AnnealingEngine.pyに登録された名前)で部分問題を解くsolve_part
+# parametersはAnnealingInfo.ChangeParametersの引数 tauは1回の読み出しあたりの時間[ms]
+# session(SamplerSession)はQPUの時だけ使う
+def annealing_solver(backend, session=None, **parameters):
+    from AnnealingEngine import AnnealingInfo, GetBackend
+    from QuboCache import GetQubo
+    from ResultAnalyzer import ResponseMatrix, AnalyzeMatrix
+
+    def solve_part(edges, Group):
+        info = AnnealingInfo(edges, Group, backend)
+        info.ChangeParameters(**parameters)
+        if backend == 'qpu':
+            info.session = session
+        w_selectEdge = info.feed_dict['w_selectEdge']
+
+        qubo, offset = GetQubo(Group, w_selectEdge)
+        response, sampling_time = GetBackend(backend)['sample'](qubo, info)
+        X, occurrences = ResponseMatrix(response, len(edges))
+        analysis = AnalyzeMatrix(X, occurrences, Group, w_selectEdge)
+        return {
+            'qubits': len(edges),
+            'tau': sampling_time/analysis['num_samples'],
+            'feasibleRate': analysis['feasibleRate'],
+            'solution': _best_sample(X, occurrences, analysis['energies']),
+        }
+
+    return solve_part
+
+# python decompose.py ChengRW100 qaoa / python decompose.py twitter10000 neal のように問題とエンジンを指定する
+if __name__ == "__main__":
+    from AnnealingEngine import BackendNames
+    parser = argparse.ArgumentParser()
+    parser.add_argument('instance')
+    parser.add_argument('engine', choices=['qaoa'] + BackendNames())
+    parser.add_argument('--method', choices=['qasm', 'statevector', 'numpy', 'adjoint'], default='qasm')
+    parser.add_argument('--maxiter', type=int, default=20)
+    parser.add_argument('--shots', type=int, default=1024)
+    parser.add_argument('--num-reads', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=10)
+    parser.add_argument('--no-reuse', action='store_true', help='同じ形の部分問題も別々に解く')
+    args = parser.parse_args()
+
+    columns, Gce = load_instance(os.path.join('json', args.instance))
+    if args.engine == 'qaoa':
+        solve_part = qaoa_solver(args.maxiter, args.shots, args.method, seed=args.seed)
+    else:
+        solve_part = annealing_solver(args.engine, num_reads=args.num_reads, seed=args.seed)
+
+    result = solve_decomposed(columns, Gce, solve_part, reuse_identical=not args.no_reuse)
+    print(f"{result['components']} components (largest {result['largest']} variables), {result['parts']} solved")
+    for name in ['tau', 'feasibleRate'] + [tts_key(target) for target in TARGET_PROBABILITIES]:
+        print(f'{name}:'.ljust(14), result[name])
+    print('objective:'.ljust(14), result['objective'])
@@ -0,0 +1,193 @@
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.optimize
+from qiskit import Aer
+from QAOA import create_qaoa_circ, get_expectation, get_violation_count, time_to_solution
+from instance import as_group_index
+from angle_cache import instance_fingerprint, interpolate_angles
+from expectation import get_numpy_expectation_and_gradient, optimize_layers
+from mps_simulator import MPSSimulator, MPS_MAX_BOND, MPS_CUTOFF
+from shot_schedule import get_sampled_objective, optimize_with_schedule
+from feasible_encoding import build_pair_encoding, create_encoded_qaoa_circ, encoded_simulator, encoded_mps_simulator, get_encoded_expectation
+from objective import get_objective_cache
+from adaptive_tts import adaptive_tts
+from workers import single_threaded_workers
+
+
+# アングルを決めるまでのCOBYLAの反復回数の上限
+MAXITER_BUDGETS = [1, 5, 10, 15, 20]
+
+# 期待値をショットなしで厳密に求める方法(最適化結果のfunはどれも同じ量なので比べられる)
+EXACT_METHODS = ('numpy', 'statevector', 'adjoint')
+
+# n_layersレイヤーのアングルをmaximum_iteration回までの反復で最適化する
+# method='adjoint'なら随伴法の勾配を使ってL-BFGS-Bで最適化し、x0のレイヤー数からn_layersまで1層ずつ増やす
+# それ以外はx0をn_layersまで補間してからCOBYLAで最適化する
+# encoding(feasible_encoding.PairEncoding)を渡すと、符号化した空間の回路で最適化する
+# shot_schedule(optimize_with_scheduleの引数の辞書)を渡すと、'qasm'と'mps'ではショット数を少ない所から増やしながら最適化する
+# (符号化した回路でも同じように増やす)
+# 結果のshotsは最適化中に使ったショット数の合計(厳密に期待値を求める方法では0)
+# max_bondとcutoffはmethod='mps'の時のMPSのボンド次元の上限と切り捨ての閾値 threadsは最適化中のAerのスレッド数
+def optimize_angles(column, Gce, maximum_iteration, shots=1024, method='qasm', x0=(1.0, 1.0), n_layers=1, encoding=None, shot_schedule=None, seed=None,
+                    max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF, threads=None):
+    if method == 'adjoint':
+        if encoding is not None:
+            expectation_and_gradient = encoded_simulator(encoding, Gce).expectation_and_gradient
+        else:
+            expectation_and_gradient = get_numpy_expectation_and_gradient(column, Gce)
+        res = optimize_layers(expectation_and_gradient, x0, n_layers, maximum_iteration)
+        res.shots = 0
+        return res
+
+    theta = np.asarray(x0, dtype=np.float64)
+    while len(theta)//2 < n_layers:
+        theta = interpolate_angles(theta)
+    if shot_schedule is not None and method in ('qasm', 'mps'):
+        sampled_objective = get_sampled_objective(column, Gce, method, seed, max_bond, cutoff, encoding, threads)
+        return optimize_with_schedule(sampled_objective, theta, maximum_iteration, **shot_schedule)
+
+    if encoding is not None:
+        expectation = get_encoded_expectation(encoding, Gce, shots, method, seed, threads, max_bond, cutoff)
+    else:
+        expectation = get_expectation(column, Gce, shots, method, seed, max_bond, cutoff, threads)
+    res = scipy.optimize.minimize(expectation,
+                list(theta),
+                method='COBYLA',
+                options={'maxiter':maximum_iteration})
+    res.shots = res.nfev * shots if method in ('qasm', 'mps') else 0
+    return res
+
+# 1回分(repetition, maxiter)の最適化と、最適化したアングルでのサンプリングを行う
+# 並列実行しても計測がぶれないよう、時間は各タスクの中だけで測る Aerはタスクの中では1スレッドで実行する
+# tts_precisionを渡すと、最後のサンプリングをtts_chunkショットずつに分けて、TTSの信頼区間がその精度に収まるまで続ける
+# (shotsとは別に小さく分けるので、簡単な問題ではshotsより少ないショット数で止まる 最低tts_min_samplesショットはサンプルする)
+# encoded=Trueなら2変数のグループを1量子ビットにした回路を使い、countsは変数のビット列に戻してから評価する
+# method='mps'なら(符号化した回路でも)最後のサンプリングもMPSから行い、切り捨て誤差を結果に入れる(MPSの設定はmax_bondとcutoff)
+def run_task(column, Gce, repetition, maximum_iteration, seed, shots=1024, method='qasm', x0=(1.0, 1.0), tts_precision=None, max_shots=2 ** 17, n_layers=1, encoded=False, shot_schedule=None,
+             max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF, tts_chunk=64, tts_min_samples=None):
+    backend = Aer.get_backend('qasm_simulator')
+    encoding = build_pair_encoding(Gce) if encoded else None
+
+    if method != 'mps':
+        simulator = None
+    elif encoding is not None:
+        simulator = encoded_mps_simulator(encoding, Gce, max_bond, cutoff)
+    else:
+        simulator = MPSSimulator(column, as_group_index(Gce).num_vars, max_bond, cutoff)
+
+    def create_circ(theta):
+        if simulator is not None:
+            return theta
+        if encoding is not None:
+            return create_encoded_qaoa_circ(encoding, Gce, theta, backend)
+        return create_qaoa_circ(column, Gce, theta, backend)
+
+    def run_circ(qc, seed_simulator, n):
+        if simulator is not None:
+            counts = simulator.sample_counts(qc, n, seed_simulator)
+        else:
+            counts = backend.run(qc, seed_simulator=seed_simulator, shots=n, max_parallel_threads=1).result().get_counts()
+        return encoding.decode_counts(counts) if encoding is not None else counts
+
+    op_opt_time = time.perf_counter()
+    res = optimize_angles(column, Gce, maximum_iteration, shots, method, x0, n_layers, encoding, shot_schedule, seed, max_bond, cutoff, threads=1)
+    ed_opt_time = time.perf_counter()
+
+    if tts_precision is None:
+        op_time = time.perf_counter()
+        qc_res = create_circ(res.x)
+        counts = run_circ(qc_res, seed, shots)
+        ed_time = time.perf_counter()
+        tau = (ed_time - op_time)/shots
+        feasibleRate = 1 - get_violation_count(counts, column, Gce)/shots
+        shots_used = shots
+    else:
+        qc_res = create_circ(res.x)
+
+        # k番目のまとまりは(seed, k)から決まるシードでサンプルする
+        def sample_chunk(n, k):
+            chunk_seed = int(np.random.SeedSequence((seed, k)).generate_state(1)[0])
+            op_time = time.perf_counter()
+            counts = run_circ(qc_res, chunk_seed, n)
+            ed_time = time.perf_counter()
+            return n - get_violation_count(counts, column, Gce), n, ed_time - op_time
+
+        measured = adaptive_tts(sample_chunk, chunk=tts_chunk, precision=tts_precision, min_samples=tts_min_samples, max_samples=max_shots)
+        tau = measured['tau']
+        feasibleRate = measured['feasibleRate']
+        shots_used = measured['samples']
+
+    return {
+        'repetition': repetition,
+        'maxiter': maximum_iteration,
+        'seed': seed,
+        'opt_time': ed_opt_time - op_opt_time,
+        'tau': tau,
+        'feasibleRate': feasibleRate,
+        'shots': shots_used,
+        'nfev': res.nfev,
+        'opt_shots': res.shots,
+        'truncation_error': simulator.truncation_error if simulator is not None else 0.0,
+        'x': res.x,
+        'fun': res.fun,
+        # このプロセスでのビット列->目的関数値キャッシュのヒット率
+        'objective_cache': get_objective_cache(Gce).stats(),
+    }
+
+# (repetition, maxiter)の組を独立なタスクとしてプロセスプールで実行し、maxiterごとに平均する
+# シードはタスクの番号から決めるので、ワーカー数によらず同じ結果になる
+# angle_cacheを渡すと、前回までの最良のアングルから最適化を始め、終わったら結果を保存する
+# n_layersはQAOAのレイヤー数p encoded=Trueなら2変数のグループを1量子ビットにした回路を使う
+# shot_schedule、max_bond、cutoffはoptimize_anglesに渡す tts_chunkとtts_min_samplesはtts_precisionを渡した時の分け方
+def run_evaluation(column, Gce, iteration=100, budgets=MAXITER_BUDGETS, workers=None, base_seed=10, shots=1024, method='qasm', angle_cache=None, tts_precision=None, n_layers=1, encoded=False, shot_schedule=None,
+                   max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF, tts_chunk=64, tts_min_samples=None):
+    x0 = (1.0, 1.0)
+    if angle_cache is not None:
+        # 符号化した回路のアングルは元の回路のものと意味が違うので別に保存する
+        # サンプルしたfunはノイズを含むので、厳密な値と最小値を比べないよう方法ごとに別に保存する(厳密な方法どうしは共有する)
+        fingerprint = instance_fingerprint(Gce) + (':pair' if encoded else '') + ':' + ('exact' if method in EXACT_METHODS else method)
+        x0 = tuple(angle_cache.initial_point(fingerprint, n_layers, x0))
+
+    tasks = [(repetition, maximum_iteration, base_seed + repetition * len(budgets) + k)
+             for repetition in range(iteration)
+             for k, maximum_iteration in enumerate(budgets)]
+
+    if workers == 1:
+        results = [run_task(column, Gce, *task, shots=shots, method=method, x0=x0, tts_precision=tts_precision, n_layers=n_layers, encoded=encoded, shot_schedule=shot_schedule, max_bond=max_bond, cutoff=cutoff,
+                            tts_chunk=tts_chunk, tts_min_samples=tts_min_samples) for task in tasks]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with single_threaded_workers(), ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(run_task, column, Gce, *task, shots=shots, method=method, x0=x0, tts_precision=tts_precision, n_layers=n_layers, encoded=encoded, shot_schedule=shot_schedule, max_bond=max_bond, cutoff=cutoff,
+                                       tts_chunk=tts_chunk, tts_min_samples=tts_min_samples) for task in tasks]
+            results = [future.result() for future in futures]
+
+    results.sort(key=lambda result: (result['repetition'], budgets.index(result['maxiter'])))
+
+    if angle_cache is not None:
+        for result in results:
+            angle_cache.update(fingerprint, len(result['x'])//2, result['x'], result['fun'])
+        angle_cache.save()
+
+    summary = {}
+    for maximum_iteration in budgets:
+        rows = [result for result in results if result['maxiter'] == maximum_iteration]
+        feasibleRate = sum(row['feasibleRate'] for row in rows)/iteration
+        tau = sum(row['tau'] for row in rows)/iteration
+        summary[maximum_iteration] = {
+            'opt_time': sum(row['opt_time'] for row in rows)/iteration,
+            'tau': tau,
+            'feasibleRate': feasibleRate,
+            'TTS': time_to_solution(tau, feasibleRate, 0.99),
+            'TTS_999': time_to_solution(tau, feasibleRate, 0.999),
+            'TTS_9999': time_to_solution(tau, feasibleRate, 0.9999),
+            'shots': sum(row['shots'] for row in rows)/iteration,
+            'nfev': sum(row['nfev'] for row in rows)/iteration,
+            'opt_shots': sum(row['opt_shots'] for row in rows)/iteration,
+            'truncation_error': max(row['truncation_error'] for row in rows),
+            'x': rows[-1]['x'],
+            'fun': rows[-1]['fun'],
+        }
+    return summary
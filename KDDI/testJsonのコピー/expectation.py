@@ -0,0 +1,97 @@
+import numpy as np
+import scipy.optimize
+from qiskit import Aer
+from angle_cache import interpolate_angles
+from instance import as_group_index
+from objective import cost_vector, evaluate_counts
+from qaoa_circuit import get_qaoa_template, bind_qaoa_circ
+from qaoa_simulator import QAOASimulator
+
+
+# 状態ベクトルで厳密に期待値を計算する量子ビット数の上限(2^24 * 16byte ≒ 256MB)
+STATEVECTOR_MAX_QUBITS = 24
+
+# ショットを使わず、状態ベクトルから<H>を厳密に求める
+# コストの対角成分は最初に一度だけ計算しておく
+def get_statevector_expectation(columns, Gce, threads=None):
+    nqubits = as_group_index(Gce).num_vars
+    if nqubits > STATEVECTOR_MAX_QUBITS:
+        raise ValueError(f"{nqubits} qubits exceed STATEVECTOR_MAX_QUBITS={STATEVECTOR_MAX_QUBITS}")
+
+    backend = Aer.get_backend('statevector_simulator')
+    cost = cost_vector(Gce, nqubits)
+
+    def execute_circ(theta):
+        template = get_qaoa_template(columns, nqubits, len(theta)//2, backend, measure=False)
+        qc = bind_qaoa_circ(template, theta)
+        statevector = np.asarray(backend.run(qc, max_parallel_threads=threads or 0).result().get_statevector())
+        return float(np.abs(statevector) ** 2 @ cost)
+
+    return execute_circ
+
+# Aerを使わず、QAOA専用のNumPyシミュレータで<H>を厳密に求める
+def get_numpy_expectation(columns, Gce):
+    nqubits = as_group_index(Gce).num_vars
+    if nqubits > STATEVECTOR_MAX_QUBITS:
+        raise ValueError(f"{nqubits} qubits exceed STATEVECTOR_MAX_QUBITS={STATEVECTOR_MAX_QUBITS}")
+
+    simulator = QAOASimulator(columns, nqubits, cost_vector(Gce, nqubits))
+    return simulator.expectation
+
+# 期待値と、全てのβ、γについての勾配を一度に返す(scipy.optimize.minimizeのjac=Trueで使う)
+# 勾配は随伴法で求めるので、レイヤー数が増えても順方向のシミュレーション2回分程度で済む
+def get_numpy_expectation_and_gradient(columns, Gce):
+    nqubits = as_group_index(Gce).num_vars
+    if nqubits > STATEVECTOR_MAX_QUBITS:
+        raise ValueError(f"{nqubits} qubits exceed STATEVECTOR_MAX_QUBITS={STATEVECTOR_MAX_QUBITS}")
+
+    simulator = QAOASimulator(columns, nqubits, cost_vector(Gce, nqubits))
+    return simulator.expectation_and_gradient
+
+# x0のレイヤー数からn_layersまで、各レイヤー数で勾配を使ってL-BFGS-Bで最適化し、
+# 最適化したアングルを補間(INTERP)して次のレイヤー数の初期値にする
+# maxiterは各レイヤー数での反復回数の上限 返すのは最後のレイヤー数での結果(nfev、nitは全体の合計)
+def optimize_layers(expectation_and_gradient, x0, n_layers, maxiter=None):
+    options = {} if maxiter is None else {'maxiter': maxiter}
+    theta = np.asarray(x0, dtype=np.float64)
+    nfev = 0
+    nit = 0
+    while True:
+        res = scipy.optimize.minimize(expectation_and_gradient, theta, method='L-BFGS-B', jac=True, options=options)
+        nfev += res.nfev
+        nit += res.nit
+        if len(res.x)//2 >= n_layers:
+            break
+        theta = interpolate_angles(res.x)
+    res.nfev = nfev
+    res.nit = nit
+    return res
+
+# 複数のthetaの期待値を一回のバックエンド呼び出し(またはベクトル化したシミュレーション)で求める
+# グリッドサーチや集団ベースの最適化のように、まとめて評価できる場面で使う
+def get_expectation_batch(columns, Gce, shots=1024, method='numpy'):
+    nqubits = as_group_index(Gce).num_vars
+    if method == 'numpy':
+        if nqubits > STATEVECTOR_MAX_QUBITS:
+            raise ValueError(f"{nqubits} qubits exceed STATEVECTOR_MAX_QUBITS={STATEVECTOR_MAX_QUBITS}")
+        simulator = QAOASimulator(columns, nqubits, cost_vector(Gce, nqubits))
+        return simulator.expectations
+
+    backend = Aer.get_backend('qasm_simulator')
+
+    def execute_circs(thetas):
+        thetas = np.atleast_2d(np.asarray(thetas, dtype=np.float64))
+        template = get_qaoa_template(columns, nqubits, thetas.shape[1]//2, backend)
+        circuits = [bind_qaoa_circ(template, theta) for theta in thetas]
+        result = backend.run(circuits, shots=shots).result()
+        return np.array([evaluate_counts(result.get_counts(i), Gce)[1] for i in range(len(circuits))])
+
+    return execute_circs
+
+# p=1のβ、γを格子点でまとめて評価し、最も期待値の小さいthetaを返す(COBYLAの初期値などに使う)
+def grid_search(expectation_batch, num=16, beta_range=(0, np.pi/2), gamma_range=(0, np.pi)):
+    beta, gamma = np.meshgrid(np.linspace(*beta_range, num), np.linspace(*gamma_range, num))
+    thetas = np.column_stack([beta.ravel(), gamma.ravel()])
+    values = expectation_batch(thetas)
+    best = int(np.argmin(values))
+    return thetas[best], values[best]
@@ -0,0 +1,184 @@
+import numpy as np
+from qiskit import Aer, QuantumCircuit, transpile
+from qiskit.circuit import ParameterVector
+from instance import as_group_index
+from objective import keys_to_matrix, evaluate_counts
+from qaoa_simulator import QAOASimulator
+from expectation import STATEVECTOR_MAX_QUBITS
+from mps_simulator import MPSSimulator, MPS_MAX_BOND, MPS_CUTOFF
+
+
+# 「2つの変数のどちらか一方を選ぶ」グループを1量子ビットで表す符号化
+# グループ{a, b}の量子ビットqに対して x_a = q, x_b = 1 - q とすれば、そのグループの制約は常に満たされる
+# 他のグループと変数を共有するグループや、係数が1でないグループの変数はそのまま1量子ビットにする
+# 変数vは x_v = offset[v] + sign[v] * q[qubit_of[v]] で元に戻す(アフィンな復号)
+class PairEncoding:
+
+    def __init__(self, qubit_of, sign, offset, num_qubits, pairs):
+        self.qubit_of = np.asarray(qubit_of, dtype=np.int64)
+        self.sign = np.asarray(sign, dtype=np.int64)
+        self.offset = np.asarray(offset, dtype=np.int64)
+        self.num_qubits = int(num_qubits)
+        self.num_vars = len(self.qubit_of)
+        # 1量子ビットにまとめたグループの番号
+        self.pairs = list(pairs)
+
+    # (サンプル数 x 量子ビット数)の0/1行列を (サンプル数 x 変数数)の0/1行列に戻す
+    def decode(self, bits):
+        return (self.offset + self.sign * bits[:, self.qubit_of].astype(np.int64)).astype(np.uint8)
+
+    # 量子ビット数の長さのビット列のcountsを、変数の数の長さのビット列のcountsにする
+    # 復号は一対一なので、違うビット列が同じビット列に重なることはない
+    def decode_counts(self, counts):
+        if len(counts) == 0:
+            return {}
+        bits = self.decode(keys_to_matrix(counts.keys(), self.num_qubits))
+        raw = (bits[:, ::-1] + ord('0')).astype(np.uint8).tobytes().decode('ascii')
+        keys = [raw[i * self.num_vars:(i + 1) * self.num_vars] for i in range(len(bits))]
+        return dict(zip(keys, counts.values()))
+
+    # 全ての制約を量子ビットで書いた Σ(Gce・x - 1)^2 = constant + Σ_jk Q_jk q_j q_k (Qは上三角)
+    def qubo(self, Gce):
+        groups = as_group_index(Gce)
+        Q = np.zeros((self.num_qubits, self.num_qubits), dtype=np.float64)
+        constant = 0.0
+        for c in range(groups.num_groups):
+            variables, coefficients = groups.members(c)
+            # 残差 r = c0 + Σ_j w_j q_j
+            c0 = -1 + float(coefficients @ self.offset[variables])
+            w = np.zeros(self.num_qubits, dtype=np.float64)
+            np.add.at(w, self.qubit_of[variables], coefficients * self.sign[variables])
+            qubits = np.flatnonzero(w)
+            # q_j^2 = q_j なので、r^2 の1次の項は 2 c0 w_j + w_j^2
+            constant += c0 ** 2
+            Q[qubits, qubits] += 2 * c0 * w[qubits] + w[qubits] ** 2
+            for i, j in enumerate(qubits):
+                Q[j, qubits[i + 1:]] += 2 * w[j] * w[qubits[i + 1:]]
+        return Q, constant
+
+    # q_j = (1 - z_j)/2 でイジング形式 constant + Σ h_j z_j + Σ J_jk z_j z_k に直す
+    def ising(self, Gce):
+        Q, constant = self.qubo(Gce)
+        diagonal = np.diag(Q).copy()
+        upper = np.triu(Q, 1)
+        symmetric = upper + upper.T
+        h = -diagonal/2 - symmetric.sum(axis=1)/4
+        J = {(int(j), int(k)): float(upper[j, k])/4 for j, k in zip(*np.nonzero(upper))}
+        constant = constant + diagonal.sum()/2 + upper.sum()/4
+        return h, J, constant
+
+    # 2^(量子ビット数)個の全基底状態に対する目的関数値(objective.cost_vectorの符号化した版)
+    def cost_vector(self, Gce):
+        groups = as_group_index(Gce)
+        states = np.arange(2 ** self.num_qubits, dtype=np.int64)
+        cost = np.zeros(2 ** self.num_qubits, dtype=np.float64)
+        for c in range(groups.num_groups):
+            residual = np.full(2 ** self.num_qubits, -1, dtype=np.int64)
+            for v, a in zip(*groups.members(c)):
+                residual += a * (self.offset[v] + self.sign[v] * ((states >> self.qubit_of[v]) & 1))
+            cost += residual ** 2
+        return cost
+
+# 変数を共有しない、係数が(1, 1)の2変数のグループを前から順に選んで1量子ビットにする
+def build_pair_encoding(Gce):
+    groups = as_group_index(Gce)
+    qubit_of = np.full(groups.num_vars, -1, dtype=np.int64)
+    sign = np.ones(groups.num_vars, dtype=np.int64)
+    offset = np.zeros(groups.num_vars, dtype=np.int64)
+
+    num_qubits = 0
+    pairs = []
+    for c in range(groups.num_groups):
+        variables, coefficients = groups.members(c)
+        if len(variables) != 2 or np.any(coefficients != 1) or np.any(qubit_of[variables] >= 0):
+            continue
+        a, b = variables
+        qubit_of[a] = qubit_of[b] = num_qubits
+        sign[b] = -1
+        offset[b] = 1
+        num_qubits += 1
+        pairs.append(c)
+
+    # 残りの変数はそのまま1量子ビットにする
+    for v in np.flatnonzero(qubit_of < 0):
+        qubit_of[v] = num_qubits
+        num_qubits += 1
+    return PairEncoding(qubit_of, sign, offset, num_qubits, pairs)
+
+# 符号化した空間でのQAOA回路 コスト層は exp(-iγ(C - constant)) を rz(2γh_j) と rzz(2γJ_jk) で作る
+# (制約が全て1量子ビットにまとまる問題ではコスト層は空になり、ミキサーだけが残る)
+def build_encoded_template(encoding, Gce, n_layers, measure=True):
+    h, J, constant = encoding.ising(Gce)
+    beta = ParameterVector('β', n_layers)
+    gamma = ParameterVector('γ', n_layers)
+
+    qc = QuantumCircuit(encoding.num_qubits)
+    qc.h(range(encoding.num_qubits))
+
+    for layer_index in range(n_layers):
+        for qubit in np.flatnonzero(h):
+            qc.rz(2 * float(h[qubit]) * gamma[layer_index], int(qubit))
+        for (j, k), coupling in J.items():
+            qc.rzz(2 * coupling * gamma[layer_index], j, k)
+        for qubit in range(encoding.num_qubits):
+            qc.rx(2 * beta[layer_index], qubit)
+
+    if measure:
+        qc.measure_all()
+    return qc, list(beta) + list(gamma)
+
+# (問題, レイヤー数, バックエンド)ごとのトランスパイル済み回路
+_templates = {}
+
+def get_encoded_template(encoding, Gce, n_layers, backend, measure=True):
+    key = (as_group_index(Gce).fingerprint(), n_layers, backend.name, measure)
+    if key not in _templates:
+        qc, parameters = build_encoded_template(encoding, Gce, n_layers, measure)
+        _templates[key] = (transpile(qc, backend), parameters)
+    return _templates[key]
+
+def create_encoded_qaoa_circ(encoding, Gce, theta, backend=None):
+    if backend is None:
+        backend = Aer.get_backend('qasm_simulator')
+    circuit, parameters = get_encoded_template(encoding, Gce, len(theta)//2, backend)
+    # コスト層が空の場合、γは回路に出てこないので代入しない
+    present = set(circuit.parameters)
+    return circuit.assign_parameters({parameter: value for parameter, value in zip(parameters, theta) if parameter in present})
+
+# 符号化した空間のシミュレータ コストは元の目的関数値、位相はコスト層 C をそのまま使う
+def encoded_simulator(encoding, Gce):
+    if encoding.num_qubits > STATEVECTOR_MAX_QUBITS:
+        raise ValueError(f"{encoding.num_qubits} qubits exceed STATEVECTOR_MAX_QUBITS={STATEVECTOR_MAX_QUBITS}")
+    cost = encoding.cost_vector(Gce)
+    return QAOASimulator(None, encoding.num_qubits, cost, phase=cost)
+
+# 符号化した回路の行列積状態シミュレータ build_encoded_templateと同じ rz(2γh_j) と rzz(2γJ_jk) をかける
+# 状態ベクトルもAerの量子ビット数の上限も関係ないので、ChengRW200(29量子ビット)やtwitter10000(62量子ビット)も扱える
+def encoded_mps_simulator(encoding, Gce, max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF):
+    h, J, _ = encoding.ising(Gce)
+    return MPSSimulator(list(J), encoding.num_qubits, max_bond, cutoff, weights=[2 * coupling for coupling in J.values()], fields=2 * h)
+
+# QAOA.get_expectationの符号化した版 'qasm'と'mps'ならcountsを変数のビット列に戻してから期待値を求める
+# threadsはAerのスレッド数 max_bondとcutoffはmethod='mps'の時のMPSの設定
+def get_encoded_expectation(encoding, Gce, shots, method='qasm', seed=None, threads=None, max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF):
+    if method in ('numpy', 'statevector'):
+        return encoded_simulator(encoding, Gce).expectation
+
+    rng = np.random.default_rng(seed)
+    if method == 'mps':
+        simulator = encoded_mps_simulator(encoding, Gce, max_bond, cutoff)
+
+        def execute_mps(theta):
+            counts = simulator.sample_counts(theta, shots, seed=int(rng.integers(2 ** 31)))
+            return evaluate_counts(encoding.decode_counts(counts), Gce)[1]
+
+        return execute_mps
+
+    backend = Aer.get_backend('qasm_simulator')
+
+    def execute_circ(theta):
+        qc = create_encoded_qaoa_circ(encoding, Gce, theta, backend)
+        counts = backend.run(qc, seed_simulator=int(rng.integers(2 ** 31)), shots=shots, max_parallel_threads=threads or 0).result().get_counts()
+        return evaluate_counts(encoding.decode_counts(counts), Gce)[1]
+
+    return execute_circ
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import numpy as np
+from instance import GroupIndex, save_instance
+
+# 頂点のIDは既存の問題と同じく 2^32 + 頂点番号
+VERTEX_ID_OFFSET = 2 ** 32
+
+
+# 頂点を次々にランダムに選んで歩き、通った辺を集める(ChengRWと同じランダムウォークのグラフ)
+# 辺はnum_edges本まで、同じ辺を二度通った場合は数えない
+def random_walk_edges(num_vertices, num_edges, rng):
+    edges = []
+    seen = set()
+    current = int(rng.integers(num_vertices))
+    while len(edges) < num_edges:
+        step = int(rng.integers(1, num_vertices))
+        following = (current + step) % num_vertices
+        key = (min(current, following), max(current, following))
+        if key not in seen:
+            seen.add(key)
+            edges.append((current, following))
+        current = following
+    return edges
+
+# 次数がべき分布になるグラフ(Chung-Lu) 頂点iの重みを (i+1)^(-1/(exponent-1)) として両端を選ぶ
+def power_law_edges(num_vertices, num_edges, rng, exponent=2.5):
+    weights = np.arange(1, num_vertices + 1, dtype=np.float64) ** (-1/(exponent - 1))
+    weights /= weights.sum()
+    # 頂点番号と次数が相関しないよう並べ替える
+    labels = rng.permutation(num_vertices)
+
+    edges = []
+    seen = set()
+    while len(edges) < num_edges:
+        batch = 2 * (num_edges - len(edges))
+        us = rng.choice(num_vertices, size=batch, p=weights)
+        vs = rng.choice(num_vertices, size=batch, p=weights)
+        for u, v in zip(us.tolist(), vs.tolist()):
+            key = (min(u, v), max(u, v))
+            if u == v or key in seen:
+                continue
+            seen.add(key)
+            edges.append((int(labels[u]), int(labels[v])))
+            if len(edges) == num_edges:
+                break
+    return edges
+
+GRAPHS = {
+    'random_walk': random_walk_edges,
+    'power_law': power_law_edges,
+}
+
+# 辺ごとに2つの向きを変数(columns)にし、どちらか一方を選ぶ制約をグループ(Tableの行)にする
+# columns[2k], columns[2k+1] が k番目の辺の2つの向き、グループkはその2つの変数
+def edges_to_instance(edges):
+    num_edges = len(edges)
+    ends = np.asarray(edges, dtype=np.uint64).reshape(num_edges, 2) + np.uint64(VERTEX_ID_OFFSET)
+    columns = np.empty((2 * num_edges, 2), dtype=np.uint64)
+    columns[0::2] = ends
+    columns[1::2] = ends[:, ::-1]
+
+    groups = GroupIndex(np.arange(0, 2 * num_edges + 1, 2), np.arange(2 * num_edges), np.ones(2 * num_edges), 2 * num_edges)
+    return columns, groups
+
+# 同じ種類、大きさ、シードなら毎回同じ問題になる
+def generate_instance(kind, num_vertices, num_edges, seed=0, **options):
+    if num_edges > num_vertices * (num_vertices - 1) // 2:
+        raise ValueError(f"{num_vertices} vertices cannot hold {num_edges} distinct edges")
+    rng = np.random.default_rng(seed)
+    return edges_to_instance(GRAPHS[kind](num_vertices, num_edges, rng, **options))
+
+# json/<name>/ に書き出す formatは 'json'(columns.json, Table.json)、'npz'(instance.npzだけ)、'both'
+# Table.jsonは密な行列なので、大きな問題は'npz'にする
+def write_instance(directory, columns, groups, format='both'):
+    os.makedirs(directory, exist_ok=True)
+    if format in ('json', 'both'):
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump(columns.tolist(), f, separators=(',', ':'))
+        with open(os.path.join(directory, 'Table.json'), 'w') as f:
+            json.dump(groups.todense().tolist(), f, separators=(',', ':'))
+    if format in ('npz', 'both'):
+        save_instance(directory, columns, groups)
+
+# python generator.py power_law 1000 500 --seed 1 --format npz のように使う
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('kind', choices=sorted(GRAPHS))
+    parser.add_argument('num_vertices', type=int)
+    parser.add_argument('num_edges', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['json', 'npz', 'both'], default='both')
+    parser.add_argument('--name', default=None)
+    args = parser.parse_args()
+
+    name = args.name or f'{args.kind}{args.num_edges}_v{args.num_vertices}_s{args.seed}'
+    columns, groups = generate_instance(args.kind, args.num_vertices, args.num_edges, args.seed)
+    write_instance(os.path.join('json', name), columns, groups, args.format)
+    print(f'json/{name}: {len(columns)} variables, {len(groups)} groups')
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+# Table.jsonの0/1行列を、グループ(行)ごとの変数インデックス配列(CSR形式)で保持する
+# 各行はほぼ2要素のone-hotなので、密行列を走査するよりO(nnz)で済むこちらを使う
+class GroupIndex:
+
+    def __init__(self, indptr, indices, data, num_vars):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.int64)
+
+        self.num_groups = len(self.indptr) - 1
+        self.num_vars = int(num_vars)
+        # 非ゼロ要素がどのグループに属するか
+        self.rows = np.repeat(np.arange(self.num_groups), np.diff(self.indptr))
+        self._fingerprint = None
+
+    def __len__(self):
+        return self.num_groups
+
+    # c番目のグループに含まれる変数と係数
+    def members(self, c):
+        start, end = self.indptr[c], self.indptr[c + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    # 2変数からなるグループの変数ペア(QAOAのRzzゲートをかける場所)
+    def pairs(self):
+        sizes = np.diff(self.indptr)
+        return [(int(self.indices[self.indptr[c]]), int(self.indices[self.indptr[c] + 1]))
+                for c in np.flatnonzero(sizes == 2)]
+
+    # (サンプル数 x 変数数)の0/1行列に対して、各グループの row・x - 1 を求める
+    def residual(self, bits):
+        contrib = bits[:, self.indices].astype(np.int64) * self.data
+        cumulative = np.zeros((bits.shape[0], len(self.indices) + 1), dtype=np.int64)
+        np.cumsum(contrib, axis=1, out=cumulative[:, 1:])
+        return cumulative[:, self.indptr[1:]] - cumulative[:, self.indptr[:-1]] - 1
+
+    # 行列の中身から決まるハッシュ値(同じTable.jsonなら実行ごとに同じ値になる)
+    def fingerprint(self):
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update(str(self.num_vars).encode())
+            for array in (self.indptr, self.indices, self.data):
+                digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+    def todense(self):
+        dense = np.zeros((self.num_groups, self.num_vars), dtype=np.int64)
+        dense[self.rows, self.indices] = self.data
+        return dense
+
+# 読み込んだTableから一度だけGroupIndexを作る
+def build_group_index(Table):
+    indptr = [0]
+    indices = []
+    data = []
+    for row in Table:
+        for j, val in enumerate(row):
+            if val != 0:
+                indices.append(j)
+                data.append(val)
+        indptr.append(len(indices))
+
+    num_vars = len(Table[0]) if len(Table) > 0 else 0
+    return GroupIndex(indptr, indices, data, num_vars)
+
+# 密なリストが渡された場合もGroupIndexとして扱えるようにする
+def as_group_index(Group):
+    if isinstance(Group, GroupIndex):
+        return Group
+    return build_group_index(Group)
+
+# json/<name>/ の columns.json と Table.json を一度だけ変換して保存しておくバイナリのキャッシュ
+# 辺のID(uint64)とグループのCSR配列をそのまま持ち、次からはJSONを読まずにnp.loadだけで済ませる
+INSTANCE_CACHE_NAME = 'instance.npz'
+INSTANCE_CACHE_VERSION = 1
+
+def _source_paths(directory):
+    return os.path.join(directory, 'columns.json'), os.path.join(directory, 'Table.json')
+
+# (サイズ, 更新時刻[ns])
+def _source_states(paths):
+    states = [os.stat(path) for path in paths]
+    return np.array([[state.st_size, state.st_mtime_ns] for state in states], dtype=np.int64)
+
+def _source_hashes(paths):
+    hashes = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            hashes.append(hashlib.sha256(f.read()).hexdigest())
+    return np.array(hashes)
+
+def _save_instance_cache(cache_path, columns, groups, states, hashes):
+    # 書きかけのファイルが残らないよう、一時ファイルに書いてから置き換える
+    tmp_path = cache_path + '.tmp.npz'
+    try:
+        np.savez(tmp_path, version=INSTANCE_CACHE_VERSION, columns=columns,
+                 indptr=groups.indptr, indices=groups.indices, data=groups.data, num_vars=groups.num_vars,
+                 source_states=states, source_hashes=hashes)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # 書き込めない場所ならキャッシュせずに続ける
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# JSONを読んで (辺のIDの配列, GroupIndex) を作り、キャッシュに保存する
+def convert_instance(directory):
+    paths = _source_paths(directory)
+    states = _source_states(paths)
+    with open(paths[0]) as f:
+        columns = np.array(json.load(f), dtype=np.uint64)
+    with open(paths[1]) as f:
+        groups = build_group_index(json.load(f))
+
+    _save_instance_cache(os.path.join(directory, INSTANCE_CACHE_NAME), columns, groups, states, _source_hashes(paths))
+    return columns, groups
+
+# 配列から直接バイナリの問題を書き出す(JSONがあればその情報も記録し、なければバイナリだけの問題になる)
+def save_instance(directory, columns, groups):
+    paths = _source_paths(directory)
+    if all(os.path.exists(path) for path in paths):
+        states, hashes = _source_states(paths), _source_hashes(paths)
+    else:
+        states, hashes = np.zeros((0, 2), dtype=np.int64), np.array([], dtype='<U64')
+    os.makedirs(directory, exist_ok=True)
+    _save_instance_cache(os.path.join(directory, INSTANCE_CACHE_NAME), np.asarray(columns, dtype=np.uint64), groups, states, hashes)
+
+# JSONかバイナリのどちらかの形で問題が置いてあるか
+def instance_exists(directory):
+    return all(os.path.exists(path) for path in _source_paths(directory)) or os.path.exists(os.path.join(directory, INSTANCE_CACHE_NAME))
+
+# キャッシュがJSONと一致していればそれを読み、そうでなければJSONから作り直す
+# サイズと更新時刻が同じなら中身は読まない 時刻だけ変わった場合はハッシュを比べ、同じならキャッシュを使い続ける
+# JSONがなくバイナリだけの問題(generator.pyで作った大きな問題など)はそのまま読む
+# どちらもなければ(問題の名前や実行するディレクトリが違う場合)、どこを探したかを書いたFileNotFoundErrorにする
+def load_instance(directory, use_cache=True):
+    paths = _source_paths(directory)
+    cache_path = os.path.join(directory, INSTANCE_CACHE_NAME)
+    has_source = all(os.path.exists(path) for path in paths)
+    if not has_source and not os.path.exists(cache_path):
+        raise FileNotFoundError(f"instance not found: {directory} (no columns.json and Table.json, and no {INSTANCE_CACHE_NAME}; "
+                                f"looked in {os.path.abspath(directory)})")
+    if has_source and (not use_cache or not os.path.exists(cache_path)):
+        return convert_instance(directory)
+
+    with np.load(cache_path) as cache:
+        if has_source and int(cache['version']) != INSTANCE_CACHE_VERSION:
+            return convert_instance(directory)
+        arrays = {name: cache[name] for name in ('columns', 'indptr', 'indices', 'data', 'num_vars', 'source_states', 'source_hashes')}
+
+    columns = arrays['columns']
+    groups = GroupIndex(arrays['indptr'], arrays['indices'], arrays['data'], arrays['num_vars'])
+    if not has_source:
+        return columns, groups
+
+    states = _source_states(paths)
+    if np.array_equal(arrays['source_states'], states):
+        return columns, groups
+
+    hashes = _source_hashes(paths)
+    if not np.array_equal(arrays['source_hashes'], hashes):
+        return convert_instance(directory)
+    _save_instance_cache(cache_path, columns, groups, states, hashes)
+    return columns, groups
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+# ボンド次元の上限と、SVDで捨てる特異値の重み(特異値の2乗の和の割合)の上限
+MPS_MAX_BOND = 64
+MPS_CUTOFF = 1e-10
+
+# QAOA回路 H → (Rzz × column) → (Rx × 全量子ビット) を行列積状態(MPS)で計算するシミュレータ
+# サイトiのテンソルは (左のボンド, 2, 右のボンド) の形で、量子ビットはqubit_at[i]
+# 隣り合わないペアのRzzはSWAPで隣まで動かしてからかける(動かした配置はそのまま次のゲートに使う)
+# 状態ベクトルを持たないので、Rzzのペアが疎でエンタングルメントが小さければ100量子ビット以上でも扱える
+# weightsを渡すとペアごとに rzz(weight * γ)、fieldsを渡すと量子ビットごとに rz(field * γ) をかける
+# (feasible_encodingの符号化した回路のように、イジング形式のhとJから作るコスト層に使う)
+class MPSSimulator:
+
+    def __init__(self, columns, nqubits, max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF, weights=None, fields=None):
+        self.columns = [(int(a), int(b)) for a, b in columns]
+        self.nqubits = nqubits
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+        self.weights = [1.0] * len(self.columns) if weights is None else [float(weight) for weight in weights]
+        self.fields = np.zeros(nqubits) if fields is None else np.asarray(fields, dtype=np.float64)
+
+    # |+>^n から始める
+    def _reset(self):
+        self.tensors = [np.full((1, 2, 1), 1/np.sqrt(2), dtype=np.complex128) for _ in range(self.nqubits)]
+        self.center = 0
+        self.qubit_at = list(range(self.nqubits))
+        self.site_of = list(range(self.nqubits))
+        # 切り捨てた特異値の2乗の和(ゲートごとの和で、1 - 忠実度のおおよその上限になる)
+        self.truncation_error = 0.0
+        self.bond = 1
+
+    # 直交中心をtargetのサイトまでQR分解で動かす(中心より左は左正規、右は右正規になる)
+    def _move_center(self, target):
+        while self.center < target:
+            c = self.center
+            left, phys, right = self.tensors[c].shape
+            q, r = np.linalg.qr(self.tensors[c].reshape(left * phys, right))
+            self.tensors[c] = q.reshape(left, phys, -1)
+            self.tensors[c + 1] = np.tensordot(r, self.tensors[c + 1], axes=(1, 0))
+            self.center += 1
+        while self.center > target:
+            c = self.center
+            left, phys, right = self.tensors[c].shape
+            q, r = np.linalg.qr(self.tensors[c].reshape(left, phys * right).T)
+            self.tensors[c] = q.T.reshape(-1, phys, right)
+            self.tensors[c - 1] = np.tensordot(self.tensors[c - 1], r.T, axes=(2, 0))
+            self.center -= 1
+
+    # サイトi, i+1をまとめた (左, 2, 2, 右) のテンソルにgate(テンソルを受け取って返す関数)を施し、SVDで分け直す
+    def _apply_two_site(self, i, gate):
+        self._move_center(i)
+        theta = np.tensordot(self.tensors[i], self.tensors[i + 1], axes=(2, 0))
+        theta = gate(theta)
+        left, _, _, right = theta.shape
+
+        u, s, vh = np.linalg.svd(theta.reshape(left * 2, 2 * right), full_matrices=False)
+        weights = s ** 2
+        total = weights.sum()
+        # 後ろから足した重みがcutoff以下の特異値は捨てる(ボンド次元はmax_bondまで)
+        discarded = np.cumsum(weights[::-1])[::-1] / total
+        keep = max(1, min(self.max_bond, int(np.count_nonzero(discarded > self.cutoff))))
+        self.truncation_error += float(weights[keep:].sum() / total)
+
+        s = s[:keep] / np.sqrt(weights[:keep].sum())
+        self.tensors[i] = u[:, :keep].reshape(left, 2, keep)
+        self.tensors[i + 1] = (s[:, None] * vh[:keep]).reshape(keep, 2, right)
+        self.center = i + 1
+        self.bond = max(self.bond, keep)
+
+    def _swap(self, i):
+        self._apply_two_site(i, lambda theta: theta.transpose(0, 2, 1, 3))
+        a, b = self.qubit_at[i], self.qubit_at[i + 1]
+        self.qubit_at[i], self.qubit_at[i + 1] = b, a
+        self.site_of[a], self.site_of[b] = i + 1, i
+
+    # rzz(γ) = exp(-iγ/2 Z_a Z_b) 隣り合うまで後ろの量子ビットを前へSWAPで動かす
+    def _apply_rzz(self, a, b, gamma):
+        i, j = sorted((self.site_of[a], self.site_of[b]))
+        for k in range(j - 1, i, -1):
+            self._swap(k)
+        phase = np.exp(-0.5j * gamma * np.array([[1, -1], [-1, 1]]))
+        self._apply_two_site(i, lambda theta: theta * phase[None, :, :, None])
+
+    # rz(φ) = exp(-iφ/2 Z) を量子ビットごとに φ = field * γ でかける(1サイトの対角なので正規形は崩れない)
+    def _apply_fields(self, gamma):
+        for qubit in np.flatnonzero(self.fields):
+            phase = np.exp(-0.5j * self.fields[qubit] * gamma * np.array([1, -1]))
+            site = self.site_of[qubit]
+            self.tensors[site] = self.tensors[site] * phase[None, :, None]
+
+    # rx(2β) = exp(-iβX) を全てのサイトにかける(1サイトのユニタリなので正規形は崩れない)
+    def _apply_mixer(self, beta):
+        c = np.cos(beta)
+        s = -1j * np.sin(beta)
+        rx = np.array([[c, s], [s, c]])
+        for i in range(self.nqubits):
+            self.tensors[i] = np.einsum('ab,lbr->lar', rx, self.tensors[i])
+
+    # theta = [β..., γ...] の回路をMPSで計算する 結果は self.tensors に残る
+    def run(self, theta):
+        n_layers = len(theta)//2
+        beta = theta[:n_layers]
+        gamma = theta[n_layers:]
+
+        self._reset()
+        for layer_index in range(n_layers):
+            self._apply_fields(gamma[layer_index])
+            for (a, b), weight in zip(self.columns, self.weights):
+                self._apply_rzz(a, b, weight * gamma[layer_index])
+            self._apply_mixer(beta[layer_index])
+        return self.truncation_error
+
+    # 直交中心を左端に動かし(右正規形)、左のサイトから順に条件付き確率でショットをまとめてサンプルする
+    # 戻り値は (ショット数 x 量子ビット数) の0/1行列で、列は量子ビットの番号
+    def sample_bits(self, shots, seed=None):
+        rng = np.random.default_rng(seed)
+        self._move_center(0)
+
+        bits = np.empty((shots, self.nqubits), dtype=np.uint8)
+        environment = np.ones((shots, 1), dtype=np.complex128)
+        for i in range(self.nqubits):
+            # 右側は右正規なので、各ショットの (0, 1) の確率は右のボンドのノルムだけから決まる
+            amplitudes = np.einsum('sl,lxr->sxr', environment, self.tensors[i])
+            probs = np.sum(np.abs(amplitudes) ** 2, axis=2)
+            probs /= probs.sum(axis=1, keepdims=True)
+            outcome = (rng.random(shots) >= probs[:, 0]).astype(np.uint8)
+            bits[:, self.qubit_at[i]] = outcome
+            environment = amplitudes[np.arange(shots), outcome]
+            environment /= np.sqrt(probs[np.arange(shots), outcome])[:, None]
+        return bits
+
+    # Aerのget_counts()と同じ形式(左端が最上位の量子ビット)のcountsを返す
+    def sample_counts(self, theta, shots, seed=None):
+        self.run(theta)
+        bits = self.sample_bits(shots, seed)
+        states, occurrences = np.unique(bits[:, ::-1], axis=0, return_counts=True)
+        raw = (states + ord('0')).astype(np.uint8).tobytes().decode('ascii')
+        return {raw[k * self.nqubits:(k + 1) * self.nqubits]: int(count) for k, count in enumerate(occurrences)}
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+import numpy as np
+from instance import as_group_index
+
+
+# counts(ビット列 -> 回数)をまとめて(サンプル数 x 変数数)の0/1行列に変換する
+# Qiskitのビット列は右端が0番目の量子ビットなので、列を反転してGceの列番号に合わせる
+def counts_to_matrix(counts, nbits):
+    occurrences = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    return keys_to_matrix(counts.keys(), nbits), occurrences
+
+def keys_to_matrix(keys, nbits):
+    keys = [key.replace(' ', '') for key in keys]
+    if len(keys) == 0:
+        return np.zeros((0, nbits), dtype=np.uint8)
+
+    raw = np.frombuffer(''.join(keys).encode('ascii'), dtype=np.uint8)
+    bits = raw.reshape(len(keys), nbits) - ord('0')
+    return bits[:, ::-1]
+
+# 全サンプルの目的関数値 Σ(Gce・x - 1)^2 をグループの非ゼロ要素だけから求める
+def objective_values(bits, Gce):
+    residual = as_group_index(Gce).residual(bits)
+    return (residual ** 2).sum(axis=1)
+
+# ビット列 -> (目的関数値, 実行可能解か) を件数の上限付きで保持するLRUキャッシュ
+# 低エネルギーのビット列は最適化の反復ごとに何度も出てくるので、二回目以降は計算しない
+class ObjectiveCache:
+
+    def __init__(self, Gce, maxsize=2 ** 16):
+        self.groups = as_group_index(Gce)
+        self.maxsize = maxsize
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # キャッシュにないビット列だけをまとめて評価し、keysの順に目的関数値を返す
+    def objectives(self, keys):
+        keys = list(keys)
+        values = np.empty(len(keys), dtype=np.int64)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = self.table.get(key)
+            if entry is None:
+                missing.append(i)
+            else:
+                self.table.move_to_end(key)
+                values[i] = entry[0]
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if len(missing) > 0:
+            missing_keys = [keys[i] for i in missing]
+            computed = objective_values(keys_to_matrix(missing_keys, self.groups.num_vars), self.groups)
+            values[missing] = computed
+            for key, obj in zip(missing_keys, computed):
+                self.table[key] = (int(obj), obj == 0)
+            while len(self.table) > self.maxsize:
+                self.table.popitem(last=False)
+        return values
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'size': len(self.table)}
+
+# 問題ごとに一つのキャッシュを使い回す
+# 行列の中身から決まるfingerprintをキーにするので、密なリストを渡すたびにGroupIndexが作り直されても同じキャッシュになる
+_caches = {}
+
+def get_objective_cache(Gce, maxsize=2 ** 16):
+    groups = as_group_index(Gce)
+    key = groups.fingerprint()
+    if key not in _caches:
+        _caches[key] = ObjectiveCache(groups, maxsize)
+    return _caches[key]
+
+# countsから目的関数値・期待値・制約違反の回数を一度に得る
+# cacheを渡すと、評価済みのビット列はキャッシュから取り出す
+def evaluate_counts(counts, Gce, cache=None):
+    groups = as_group_index(Gce)
+    if cache is not None:
+        occurrences = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        objectives = cache.objectives(counts.keys())
+    else:
+        bits, occurrences = counts_to_matrix(counts, groups.num_vars)
+        objectives = objective_values(bits, groups)
+
+    total = occurrences.sum()
+    expectation = float(objectives @ occurrences) / total if total > 0 else 0.0
+    violation_count = int(occurrences[objectives > 0].sum())
+    return objectives, expectation, violation_count
+
+# 2^n個の全基底状態に対する目的関数値(コストハミルトニアンの対角成分)
+# 基底状態のインデックスのjビット目がj番目の変数(Qiskitの量子ビット順)に対応する
+def cost_vector(Gce, nqubits):
+    groups = as_group_index(Gce)
+    states = np.arange(2 ** nqubits, dtype=np.int64)
+    cost = np.zeros(2 ** nqubits, dtype=np.float64)
+    for c in range(groups.num_groups):
+        residual = np.full(2 ** nqubits, -1, dtype=np.int64)
+        for e, a in zip(*groups.members(c)):
+            residual += a * ((states >> e) & 1)
+        cost += residual ** 2
+    return cost
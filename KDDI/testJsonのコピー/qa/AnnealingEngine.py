@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import math
+import threading
+import numpy as np
+import dimod
+import neal
+import openjij as oj
+
+#QAOA側と共通のモジュールを読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instance import load_instance
+from QuboCache import GetQubo
+from ResultAnalyzer import AnalyzeResponse
+from SamplerSession import SamplerSession
+from adaptive_tts import adaptive_tts
+
+# 接続情報をオプションとして渡す場合は以下のようにします。
+endpoint = 'https://cloud.dwavesys.com/sapi'
+token = 'rCeY-676158a994ab2c64eaee29749e95d4c998bfdc20'
+solver = 'Advantage_system4.1'
+hybrid_solver = 'hybrid_binary_quadratic_model_version2p'
+
+#プロセス内で共有するD-Waveのクライアント(最初に使う時に接続する)
+#スイープで複数のスレッドから呼ばれても一つだけ作るようにロックする
+_session = None
+_hybrid_sampler = None
+_client_lock = threading.Lock()
+
+def GetDefaultSession():
+    global _session
+    with _client_lock:
+        if _session is None:
+            # DWaveSamplerを用います。
+            from dwave.system.samplers import DWaveSampler
+            _session = SamplerSession(DWaveSampler(endpoint=endpoint, token=token, solver=solver))
+    return _session
+
+def GetHybridSampler():
+    global _hybrid_sampler
+    with _client_lock:
+        if _hybrid_sampler is None:
+            from dwave.system import LeapHybridSampler
+            _hybrid_sampler = LeapHybridSampler(endpoint=endpoint, token=token, solver=hybrid_solver)
+    return _hybrid_sampler
+
+#バックエンド名 -> サンプルする関数と、そのバックエンドが使うパラメータ
+#関数は (qubo, parameters) を受け取り、(response, サンプリングにかかった時間[ms]) を返す
+_backends = {}
+
+def RegisterBackend(name, parameter_names, remote=False):
+    def register(function):
+        _backends[name] = {'sample': function, 'parameters': parameter_names, 'remote': remote}
+        return function
+    return register
+
+def GetBackend(name):
+    if name not in _backends:
+        raise ValueError(f"unknown backend '{name}' (available: {', '.join(sorted(_backends))})")
+    return _backends[name]
+
+def BackendNames():
+    return sorted(_backends)
+
+#D-WaveのQPU 時間はQPUが返すqpu_sampling_time(μs)を使う
+@RegisterBackend('qpu', ['annealing_time', 'num_reads'], remote=True)
+def SampleQPU(qubo, parameters):
+    #クライアントと埋め込みは呼び出しをまたいで使い回す(埋め込みはQUBOのグラフが初めての時だけ計算する)
+    session = parameters.session if parameters.session is not None else GetDefaultSession()
+    response = session.sample_qubo(qubo, annealing_time = parameters.annealing_time, num_reads = parameters.num_reads)
+    return response, response.info['timing']['qpu_sampling_time'] / 1000
+
+#Leapのハイブリッドソルバー time_limit(秒)の間に1つの解を返す
+#QPU用のsession(SamplerSession)は使わず、hybrid_samplerを使う
+@RegisterBackend('hybrid', ['time_limit'], remote=True)
+def SampleHybrid(qubo, parameters):
+    sampler = parameters.hybrid_sampler if parameters.hybrid_sampler is not None else GetHybridSampler()
+    start = time.perf_counter()
+    response = sampler.sample_qubo(qubo, time_limit=parameters.time_limit)
+    return response, (time.perf_counter() - start) * 1000
+
+#openjijのシミュレーテッド量子アニーリング
+@RegisterBackend('sqa', ['num_sweeps', 'num_reads', 'beta', 'gamma', 'trotter'])
+def SampleSQA(qubo, parameters):
+    sampler = oj.SQASampler()
+    start = time.perf_counter()
+    response = sampler.sample_qubo(Q=qubo, beta=parameters.beta, gamma=parameters.gamma, trotter=parameters.trotter, num_sweeps=parameters.num_sweeps, num_reads=parameters.num_reads, seed=parameters.seed)
+    return response, (time.perf_counter() - start) * 1000
+
+#openjijのシミュレーテッドアニーリング
+@RegisterBackend('sa', ['num_sweeps', 'num_reads'])
+def SampleSA(qubo, parameters):
+    sampler = oj.SASampler()
+    start = time.perf_counter()
+    response = sampler.sample_qubo(Q=qubo, num_sweeps=parameters.num_sweeps, num_reads=parameters.num_reads, seed=parameters.seed)
+    return response, (time.perf_counter() - start) * 1000
+
+#D-Waveのneal(シミュレーテッドアニーリング)
+@RegisterBackend('neal', ['num_sweeps', 'num_reads'])
+def SampleNeal(qubo, parameters):
+    sampler = neal.SimulatedAnnealingSampler()
+    start = time.perf_counter()
+    response = sampler.sample_qubo(qubo, num_sweeps=parameters.num_sweeps, num_reads=parameters.num_reads, seed=parameters.seed)
+    return response, (time.perf_counter() - start) * 1000
+
+#全状態を列挙して基底状態を1つだけ返す(小さい問題の検証用 変数が20個程度まで)
+#縮退した基底状態を全て返すと、列挙の時間がその数で割られて1回あたりの時間にならないので、
+#列挙全体を1回の読み出しとして数える(時間は列挙にかかった時間、TTSはそのまま列挙1回分になる)
+@RegisterBackend('exact', [])
+def SampleExact(qubo, parameters):
+    start = time.perf_counter()
+    response = dimod.ExactSolver().sample_qubo(qubo).truncate(1)
+    return response, (time.perf_counter() - start) * 1000
+
+#quiet=Trueなら読み込んだ中身を表示しない(大きな問題では表示に一番時間がかかる)
+def ImportImputJSON(fileName, quiet=False):
+    # 2回目からはjson/<name>/instance.npzを読むだけで済む
+    columns, Group = load_instance('json/' + fileName)
+    if quiet:
+        return columns, Group
+
+    print('json/' + fileName + '/columns.json')
+    print("edges")
+    print(columns.tolist())
+    print()
+
+    print("Group")
+    print(Group.todense().tolist())
+    print()
+
+    return columns, Group
+
+#各種アニーリングパラメータを設定するクラス(全バックエンド共通)
+class AnnealingInfo:
+
+    #コンストラクタ 全ての必要なパラメータ値を入手する
+    def __init__(self, edges, Group, backend='qpu'):
+        GetBackend(backend)
+        self.backend = backend
+
+        self.num_const = len(Group)
+        self.num_edges = len(edges)
+
+        self.feed_dict = {}
+        self.ChangeParameters()
+        #QUBOをファイルにも保存する場合のディレクトリ(Noneならメモリ上だけ)
+        self.qubo_cache_dir = None
+        #QPUのサンプラーのセッション(Noneなら共有のD-Waveのクライアントを使う)
+        self.session = None
+        #ハイブリッドソルバーのサンプラー(Noneなら共有のLeapHybridSamplerを使う)
+        self.hybrid_sampler = None
+
+        print("success for build constractor")
+
+    def Print(self):
+        print()
+        print(f"#constraints = {self.num_const}, #edges = {self.num_edges}")
+        print()
+
+        print(f"backend : {self.backend}")
+        for name in GetBackend(self.backend)['parameters']:
+            print(f"{name} : {getattr(self, name)}")
+        print()
+
+        print(f"w_selectEdge = {self.feed_dict['w_selectEdge']}")
+        print()
+
+    #アニーリングのパラメータを変更したい時の関数 使わないバックエンドのパラメータは無視される
+    def ChangeParameters(self, num_reads=1000, annealing_time=20, num_sweeps=100, beta=5.0, gamma=1.0, trotter=10, time_limit=1, w_selectEdge=1, seed=None, printDetails=False):
+        self.num_reads = num_reads
+        self.annealing_time = annealing_time
+        self.num_sweeps = num_sweeps
+        self.beta = beta
+        self.gamma = gamma
+        self.trotter = trotter
+        self.time_limit = time_limit
+        self.feed_dict['w_selectEdge'] = w_selectEdge
+        self.seed = seed
+        self.printDetails = printDetails
+
+def TimeToSolution(tau, feasibleRate, targetProbability):
+    if feasibleRate==1:
+        time = tau
+    #実行可能解が一つも出なかった場合は何回繰り返しても届かないとみなす
+    elif feasibleRate==0:
+        time = math.inf
+    else:
+        time = tau * math.ceil(math.log(1-targetProbability)/math.log(1-feasibleRate))
+    return time
+
+#parameters.backendのサンプラーでQUBOを解き、どのバックエンドでも同じ形のresultTableを返す
+def ExecuteAnnealing(edges, Group, parameters):
+    backend = GetBackend(parameters.backend)
+
+    #ここから時間計測開始
+    prepare_start = time.perf_counter()
+
+    #制約 Σ(Group・x - 1)^2 をpyquboでコンパイルせずに直接QUBOへ展開する
+    #同じGroupとw_selectEdgeのQUBOは一度だけ作り、以降はキャッシュから取り出す
+    qubo, offset = GetQubo(Group, parameters.feed_dict['w_selectEdge'], parameters.qubo_cache_dir)
+
+    prepare_time = time.perf_counter() - prepare_start
+
+    response, sampling_time = backend['sample'](qubo, parameters)
+
+    #実行結果を行列のまままとめて解析する(同じ解はnum_occurrencesで重み付け)
+    analysis = AnalyzeResponse(response, Group, parameters.feed_dict['w_selectEdge'], parameters.num_edges)
+    violation = analysis['violation']
+    #読み出し1回ごとのエネルギー
+    solution_energies = np.repeat(analysis['energies'], analysis['occurrences'])
+
+    minimum_cost = response.first[1]
+    count = response.first[2]
+    feasibleSolutionRate = analysis['feasibleRate']
+    #1回の読み出しあたりの時間[ms] 実際に返ってきたサンプル数で割る(ハイブリッドは1つしか返さない)
+    oneExecTime = sampling_time / analysis['num_samples']
+
+    resultTable = {}
+    resultTable['min'] = float(solution_energies.min())
+    resultTable['mean'] = float(solution_energies.mean())
+    resultTable['max'] = float(solution_energies.max())
+    resultTable['feasibleRate'] = feasibleSolutionRate
+    resultTable['time'] = oneExecTime
+    resultTable['TTS'] = TimeToSolution(oneExecTime, feasibleSolutionRate, 0.99)
+
+
+    if parameters.printDetails==True:
+        print()
+        print('[Execution Result]')
+        print('Backend:', parameters.backend)
+        print('Feasible Solution Rate:', feasibleSolutionRate)
+        print('Each Violation Count:', violation)
+        print('Minimum Cost:', minimum_cost)
+        print('Minimum Cost Result Count:', count)
+        print()
+        print('[Execution Time (ms)]')
+        print('prepare_time: ', prepare_time * 1000)
+        print('sampling_time: ', sampling_time)
+        print('execution_time/a execution: ', oneExecTime)
+        print('Time to Solution (TTS): ', resultTable['TTS'])
+        print()
+        print('[Energy statistics]')
+        print('最小値:', solution_energies.min())
+        print('最大値:', solution_energies.max())
+
+    return resultTable
+
+#chunk回ずつ繰り返しサンプルし、TTSの信頼区間の幅が推定値のprecision倍に収まったら止める(最低min_reads回は読み出す)
+#chunkはparameters.num_readsとは別に小さくしておくので、簡単な問題ではnum_readsより少ない回数で止まる
+#resultTableには通常の項目に加えて、使った読み出し回数と実行可能解の割合・TTSの区間を入れる
+def ExecuteAdaptiveAnnealing(edges, Group, parameters, precision=0.2, max_reads=100000, chunk=100, min_reads=None):
+    backend = GetBackend(parameters.backend)
+    qubo, offset = GetQubo(Group, parameters.feed_dict['w_selectEdge'], parameters.qubo_cache_dir)
+
+    base_seed = parameters.seed
+    num_reads = parameters.num_reads
+    energies = []
+    occurrences = []
+
+    def sample_chunk(n, k):
+        #まとまりごとにシードを変える(最後のまとまりは残りの回数だけ読み出す)
+        parameters.num_reads = n
+        if base_seed is not None:
+            parameters.seed = base_seed + k
+        response, sampling_time = backend['sample'](qubo, parameters)
+        analysis = AnalyzeResponse(response, Group, parameters.feed_dict['w_selectEdge'], parameters.num_edges)
+        energies.append(analysis['energies'])
+        occurrences.append(analysis['occurrences'])
+        #ハイブリッドのように読み出し回数と返ってくる解の数が違う場合は、返ってきた数で数える
+        num_samples = analysis['num_samples']
+        return num_samples - analysis['sol_violation_count'], num_samples, sampling_time
+
+    try:
+        measured = adaptive_tts(sample_chunk, chunk=chunk, precision=precision, targets=[0.99], min_samples=min_reads, max_samples=max_reads)
+    finally:
+        parameters.num_reads = num_reads
+        parameters.seed = base_seed
+
+    solution_energies = np.repeat(np.concatenate(energies), np.concatenate(occurrences))
+
+    resultTable = {}
+    resultTable['min'] = float(solution_energies.min())
+    resultTable['mean'] = float(solution_energies.mean())
+    resultTable['max'] = float(solution_energies.max())
+    resultTable['feasibleRate'] = measured['feasibleRate']
+    resultTable['time'] = measured['tau']
+    resultTable['TTS'] = measured['TTS']
+    resultTable['num_reads'] = measured['samples']
+    resultTable['feasibleRate_low'] = measured['feasibleRate_low']
+    resultTable['feasibleRate_high'] = measured['feasibleRate_high']
+    resultTable['TTS_low'] = measured['TTS_low']
+    resultTable['TTS_high'] = measured['TTS_high']
+
+    if parameters.printDetails==True:
+        print()
+        print('[Adaptive Execution Result]')
+        print('Backend:', parameters.backend)
+        print('Reads:', measured['samples'], 'converged' if measured['converged'] else 'not converged')
+        print('Feasible Solution Rate:', measured['feasibleRate'], (measured['feasibleRate_low'], measured['feasibleRate_high']))
+        print('Time to Solution (TTS): ', measured['TTS'], (measured['TTS_low'], measured['TTS_high']))
+
+    return resultTable
+
+def Main(fileName, backend):
+    edges, Group = ImportImputJSON(fileName)
+
+    #AnnealingInfoのインスタンス作成
+    parameters = AnnealingInfo(edges, Group, backend)
+    parameters.ChangeParameters(printDetails=True)
+    parameters.Print()
+
+    resultTable = ExecuteAnnealing(edges, Group, parameters)
+
+
+#python qa/AnnealingEngine.py twitter10000 neal のように問題とバックエンドを指定する
+if __name__ == "__main__":
+    fileName = sys.argv[1] if len(sys.argv) > 1 else 'twitter10000'
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'qpu'
+    Main(fileName, backend)
@@ -10,7 +10,8 @@ import statistics as stats
 import pandas as pd
 import sys
 
-from QAVerifierOneshot import ImportImputJSON, AnnealingInfo, ExecuteQA
+from QAVerifierOneshot import ImportImputJSON, BACKEND
+from SweepEngine import SweepGrid, RunSweep, SweepName, OpenSink, ExportResult
 
 def getArgments():
     if len(sys.argv) != 4:
@@ -22,29 +23,20 @@ def getArgments():
         args.append(int(sys.argv[3]))
     return args
 
-def ExportResult(Result, filename):
-    df = pd.DataFrame.from_dict(Result)
-    df = df.T
-    path = f'output/{filename}.json'
-    df.to_json(path)
-    print(df)
-
 def Main():
     filename = 'ChengRW200' #ここを変えればいい！
-    edges, Group = ImportImputJSON(filename)
-
-    parameters = AnnealingInfo(edges, Group)
+    edges, Group = ImportImputJSON(filename, quiet=True)
 
     ranges = getArgments()
 
-    Result = {}
-    for annealing_time in range(ranges[0], ranges[1], ranges[2]):
-        parameters.ChangeParameters(annealing_time = annealing_time)
-        resultTable = ExecuteQA(edges, Group, parameters)
-        Result[f'{annealing_time}'] = resultTable 
-        print(annealing_time)
+    #各点を並列に実行する(QPUは同時に投げるジョブ数を制限、ローカルはプロセスプール)
+    #1点終わるごとにoutput/{name}.jsonlへ追記し、途中で止まっても同じコマンドで続きから再開できる
+    axes = {'annealing_time': range(ranges[0], ranges[1], ranges[2])}
+    name = SweepName(filename, BACKEND, axes)
+    with OpenSink(name, filename, BACKEND) as sink:
+        Result = RunSweep(edges, Group, BACKEND, SweepGrid(**axes), sink=sink, on_result=lambda key, point, resultTable: print(key))
 
-    ExportResult(Result, filename) #'test'部分を保存したい名前に変更．できれば自動化したいな
+    ExportResult(Result, name)
 
 if __name__ == "__main__":
     Main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+import numpy as np
+import dimod
+
+
+# 制約 w Σ_c (Σ_e a_ce x_e - 1)^2 を、pyquboの記号計算を使わずにQUBOの係数へ直接展開する
+#   x_e^2 = x_e より 対角成分 w(a_ce^2 - 2a_ce)、非対角成分 2w a_ce a_cf、定数 w × 制約数
+# 変数のラベルは辺の番号(0, 1, ...)をそのまま使う
+def BuildQuboArrays(Group, w_selectEdge):
+    linear = np.zeros(Group.num_vars, dtype=np.float64)
+    np.add.at(linear, Group.indices, w_selectEdge * (Group.data ** 2 - 2 * Group.data))
+
+    #同じ大きさのグループごとにまとめて、グループ内の全ての変数の組を作る
+    rows, cols, biases = [], [], []
+    sizes = np.diff(Group.indptr)
+    for size in np.unique(sizes[sizes >= 2]):
+        starts = Group.indptr[:-1][sizes == size]
+        members = Group.indices[starts[:, None] + np.arange(size)]
+        coefficients = Group.data[starts[:, None] + np.arange(size)]
+        iu, ju = np.triu_indices(size, 1)
+        rows.append(members[:, iu].ravel())
+        cols.append(members[:, ju].ravel())
+        biases.append((2 * w_selectEdge * coefficients[:, iu] * coefficients[:, ju]).ravel())
+
+    if len(rows) > 0:
+        u = np.concatenate(rows)
+        v = np.concatenate(cols)
+        lo, hi = np.minimum(u, v), np.maximum(u, v)
+        #複数のグループに出てくる組は係数を足し合わせる
+        pair_ids, inverse = np.unique(lo * Group.num_vars + hi, return_inverse=True)
+        quadratic = np.bincount(inverse, weights=np.concatenate(biases))
+        qrow, qcol = pair_ids // Group.num_vars, pair_ids % Group.num_vars
+    else:
+        qrow = qcol = np.zeros(0, dtype=np.int64)
+        quadratic = np.zeros(0, dtype=np.float64)
+
+    offset = float(w_selectEdge * Group.num_groups)
+    return linear, (qrow, qcol, quadratic), offset
+
+# sample_quboにそのまま渡せる辞書形式のQUBOと定数項
+def BuildQubo(Group, w_selectEdge):
+    linear, (qrow, qcol, quadratic), offset = BuildQuboArrays(Group, w_selectEdge)
+    qubo = {(int(e), int(e)): float(linear[e]) for e in np.unique(Group.indices)}
+    for u, v, bias in zip(qrow, qcol, quadratic):
+        if bias != 0:
+            qubo[(int(u), int(v))] = float(bias)
+    return qubo, offset
+
+# dimodのBQMとして作る
+def BuildBQM(Group, w_selectEdge):
+    linear, quadratic, offset = BuildQuboArrays(Group, w_selectEdge)
+    return dimod.BinaryQuadraticModel.from_numpy_vectors(linear, quadratic, offset, dimod.BINARY)
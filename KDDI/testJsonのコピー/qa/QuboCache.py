@@ -0,0 +1,35 @@
+import os
+import pickle
+from QuboBuilder import BuildQubo
+
+
+# (Groupの中身, w_selectEdge) -> (qubo, offset)
+_qubos = {}
+
+# Groupの行列とペナルティの重みから決まるキャッシュのキー
+def QuboKey(Group, w_selectEdge):
+    return f"{Group.fingerprint()}_w{float(w_selectEdge)!r}"
+
+# ループやスイープで同じQUBOを何度も作らないよう、一度作ったものはメモリ(とcache_dir)に残しておく
+def GetQubo(Group, w_selectEdge, cache_dir=None):
+    key = QuboKey(Group, w_selectEdge)
+    if key in _qubos:
+        return _qubos[key]
+
+    path = os.path.join(cache_dir, key + '.pkl') if cache_dir is not None else None
+    if path is not None and os.path.exists(path):
+        with open(path, 'rb') as f:
+            _qubos[key] = pickle.load(f)
+        return _qubos[key]
+
+    _qubos[key] = BuildQubo(Group, w_selectEdge)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        #書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(_qubos[key], f)
+        os.replace(path + '.tmp', path)
+    return _qubos[key]
+
+def ClearQuboCache():
+    _qubos.clear()
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+# サンプラーの結果(response.record)を (サンプル数 x 辺の数)の0/1行列と出現回数にする
+def ResponseMatrix(response, num_edges):
+    labels = np.asarray(response.variables, dtype=np.int64)
+    samples = np.asarray(response.record.sample)
+    occurrences = np.asarray(response.record.num_occurrences, dtype=np.int64)
+
+    #サンプルの列を辺の番号に並べ替える(QUBOに出てこない辺は0)
+    X = np.zeros((len(samples), num_edges), dtype=np.int8)
+    X[:, labels] = samples
+    return X, occurrences
+
+# サンプラーの結果を行列のまままとめて解析する
+# 同じ解が複数回出た場合はnum_occurrencesで重み付けする
+def AnalyzeResponse(response, Group, w_selectEdge, num_edges):
+    X, occurrences = ResponseMatrix(response, num_edges)
+    return AnalyzeMatrix(X, occurrences, Group, w_selectEdge)
+
+# 各サンプルの制約の残差 Group・x - 1 を一度に求め、エネルギーと制約違反を計算する
+def AnalyzeMatrix(X, occurrences, Group, w_selectEdge):
+    residual = Group.residual(X)
+    #制約のエネルギー Σ(Group・x - 1)^2 (QUBOの定数項込みのエネルギーは w 倍したもの)
+    constraint_energies = (residual ** 2).sum(axis=1)
+    feasible = constraint_energies == 0
+
+    num_samples = int(occurrences.sum())
+    sol_violation_count = int(occurrences[~feasible].sum())
+
+    result = {}
+    result['energies'] = w_selectEdge * constraint_energies
+    result['occurrences'] = occurrences
+    result['feasible'] = feasible
+    result['num_samples'] = num_samples
+    result['sol_violation_count'] = sol_violation_count
+    result['feasibleRate'] = 1 - sol_violation_count/num_samples
+    result['violation'] = {'w_selectEdge': int(constraint_energies @ occurrences)}
+    #制約ごとに破られた回数
+    result['constraint_violations'] = (residual != 0).T.astype(np.int64) @ occurrences
+    return result
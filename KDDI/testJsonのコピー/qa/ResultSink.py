@@ -0,0 +1,69 @@
+import json
+import os
+import time
+import platform
+
+
+# スイープの結果を1点終わるごとにJSON Lines形式で追記していくファイル
+# 各行は {'type': 'run', ...} (実行を始めた時の設定) か {'type': 'point', 'key', 'point', 'result'} (1点の結果)
+# 途中で止まっても、同じファイルを開き直せば終わった点を読み込んで続きから実行できる
+class ResultSink:
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.results = {}
+        self.points = {}
+        if os.path.exists(path):
+            self._Load()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'a')
+        #最後の行が途中で切れていたら改行してから追記する
+        if self.file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+        self._Append({'type': 'run', 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'host': platform.node(), **self.metadata})
+
+    def _Load(self):
+        with open(self.path) as f:
+            for line in f:
+                #書き込み途中で止まった最後の行は読み飛ばす
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record['type'] == 'run':
+                    self._CheckMetadata(record)
+                elif record['type'] == 'point':
+                    self.results[record['key']] = record['result']
+                    self.points[record['key']] = record['point']
+
+    #設定の違う実行の結果が混ざらないよう、同じ項目の値が違えば続きからの実行を断る
+    def _CheckMetadata(self, record):
+        for name, value in self.metadata.items():
+            if name in record and record[name] != json.loads(json.dumps(value)):
+                raise ValueError(f"{self.path} was written with {name}={record[name]!r}, not {value!r}")
+
+    def _Append(self, record):
+        self.file.write(json.dumps(record, default=float) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def IsCompleted(self, key):
+        return key in self.results
+
+    def Write(self, key, point, resultTable):
+        self._Append({'type': 'point', 'key': key, 'point': point, 'result': resultTable})
+        self.results[key] = resultTable
+        self.points[key] = point
+
+    def Close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
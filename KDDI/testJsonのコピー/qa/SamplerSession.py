@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+import dimod
+import minorminer
+import neal
+import networkx as nx
+from dwave.system import FixedEmbeddingComposite
+
+try:
+    import dwave_networkx as dnx
+except ImportError:
+    import dwave.graphs as dnx
+
+
+# QUBOのグラフ構造(変数と相互作用のある組)だけから決まるキー 係数が違っても同じ埋め込みを使える
+def QuboGraphKey(qubo):
+    nodes = sorted({u for u, v in qubo} | {v for u, v in qubo}, key=str)
+    edges = sorted({tuple(sorted((u, v), key=str)) for u, v in qubo if u != v}, key=str)
+    digest = hashlib.sha256(repr((nodes, edges)).encode())
+    return digest.hexdigest()[:16]
+
+# 一つのサンプラー(クライアント)を開いたまま使い回し、QUBOのグラフごとに埋め込みを保持するセッション
+# 同じトポロジーのQUBOを何度も投げる場合、埋め込みのヒューリスティックは最初の一回だけ実行される
+class SamplerSession:
+
+    def __init__(self, child, random_seed=None):
+        self.child = child
+        self.random_seed = random_seed
+        self.embeddings = {}
+        self.composites = {}
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        #スレッドから同時に使われても、同じグラフの埋め込みを二重に計算しないようにする
+        self.lock = threading.Lock()
+
+    def GetEmbedding(self, qubo):
+        key = QuboGraphKey(qubo)
+        with self.lock:
+            return key, self._GetEmbedding(key, qubo)
+
+    def _GetEmbedding(self, key, qubo):
+        if key in self.embeddings:
+            self.embedding_hits += 1
+            return self.embeddings[key]
+
+        self.embedding_misses += 1
+        source = nx.Graph()
+        source.add_nodes_from({u for u, v in qubo} | {v for u, v in qubo})
+        source.add_edges_from((u, v) for u, v in qubo if u != v)
+        target = nx.Graph(self.child.edgelist)
+        target.add_nodes_from(self.child.nodelist)
+
+        embedding = minorminer.find_embedding(source, target, random_seed=self.random_seed)
+        if len(embedding) < source.number_of_nodes():
+            raise ValueError("no embedding found for the QUBO graph")
+        self.embeddings[key] = embedding
+        self.composites[key] = FixedEmbeddingComposite(self.child, embedding)
+        return embedding
+
+    def sample_qubo(self, qubo, **parameters):
+        key, embedding = self.GetEmbedding(qubo)
+        return self.composites[key].sample_qubo(qubo, **parameters)
+
+# オフラインで試すための、QPUの代わりになるローカルのサンプラー
+# Pegasusグラフの構造を持ち、中身はシミュレーテッドアニーリング(neal)で解く
+# QPUと同じようにresponse.info['timing']['qpu_sampling_time'](μs)を返す
+class LocalStructuredSampler(dimod.Sampler, dimod.Structured):
+
+    def __init__(self, graph=None):
+        if graph is None:
+            graph = dnx.pegasus_graph(6)
+        self._nodelist = sorted(graph.nodes)
+        self._edgelist = sorted(tuple(sorted(edge)) for edge in graph.edges)
+        self.child = neal.SimulatedAnnealingSampler()
+
+    @property
+    def nodelist(self):
+        return self._nodelist
+
+    @property
+    def edgelist(self):
+        return self._edgelist
+
+    @property
+    def properties(self):
+        return {'topology': {'type': 'pegasus'}}
+
+    @property
+    def parameters(self):
+        return {'num_reads': [], 'annealing_time': [], 'num_sweeps': [], 'seed': []}
+
+    #annealing_timeはQPU用のパラメータなので使わない
+    def sample(self, bqm, num_reads=1, annealing_time=None, **parameters):
+        start = time.perf_counter()
+        response = self.child.sample(bqm, num_reads=num_reads, **parameters)
+        sampling_time = (time.perf_counter() - start) * 1e6
+        response.info['timing'] = {'qpu_sampling_time': sampling_time}
+        return response
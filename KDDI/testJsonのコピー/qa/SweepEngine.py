@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+from AnnealingEngine import ImportImputJSON, AnnealingInfo, ExecuteAnnealing, GetBackend
+from ResultSink import ResultSink
+from workers import single_threaded_workers
+
+#スイープできるパラメータ(AnnealingInfo.ChangeParametersの引数名)
+SWEEP_AXES = ['num_sweeps', 'trotter', 'beta', 'gamma', 'annealing_time', 'w_selectEdge']
+
+#軸ごとの値の並びから、全ての組み合わせ(グリッドの点)を作る 後ろの軸ほど速く変わる
+def SweepGrid(**axes):
+    for name in axes:
+        if name not in SWEEP_AXES:
+            raise ValueError(f"cannot sweep '{name}' (available: {', '.join(SWEEP_AXES)})")
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(axes[name]) for name in names))]
+
+#ExportResultの表の行名 1次元のスイープなら今まで通り値だけにする
+def PointKey(point):
+    if len(point) == 1:
+        return f'{next(iter(point.values()))}'
+    return ','.join(f'{name}={value}' for name, value in point.items())
+
+#グリッドの1点を実行する fixedは全ての点で共通のパラメータ
+def RunPoint(edges, Group, backend, point, fixed, seed):
+    parameters = AnnealingInfo(edges, Group, backend)
+    parameters.ChangeParameters(**{**fixed, **point, 'seed': seed})
+    return ExecuteAnnealing(edges, Group, parameters)
+
+#ローカルのバックエンドはCPUを使い切るので、点ごとにプロセスプールで並列に実行する
+#終わった順にon_resultへ渡し、失敗した点があっても他の点を全て書き出してから最初の例外を投げ直す
+def _RunLocal(edges, Group, backend, tasks, fixed, workers, on_result):
+    errors = []
+    if workers == 1:
+        for key, point, seed in tasks:
+            try:
+                resultTable = RunPoint(edges, Group, backend, point, fixed, seed)
+            except Exception as error:
+                errors.append(error)
+                continue
+            on_result(key, point, resultTable)
+    else:
+        context = multiprocessing.get_context('spawn')
+        with single_threaded_workers(), ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(RunPoint, edges, Group, backend, point, fixed, seed): (key, point)
+                       for key, point, seed in tasks}
+            for future in as_completed(futures):
+                key, point = futures[future]
+                try:
+                    resultTable = future.result()
+                except Exception as error:
+                    errors.append(error)
+                    continue
+                on_result(key, point, resultTable)
+    if errors:
+        raise errors[0]
+
+#リモートのバックエンドは待ち時間がほとんどなので、同時に投げるジョブ数だけ制限してスレッドで待つ
+#ローカルと同じく、失敗した点があっても他の点が終わるのを待ってから最初の例外を投げ直す
+async def _RunRemote(edges, Group, backend, tasks, fixed, max_concurrency, on_result):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(key, point, seed):
+        async with semaphore:
+            resultTable = await asyncio.to_thread(RunPoint, edges, Group, backend, point, fixed, seed)
+        on_result(key, point, resultTable)
+
+    outcomes = await asyncio.gather(*(run(key, point, seed) for key, point, seed in tasks), return_exceptions=True)
+    errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if errors:
+        raise errors[0]
+
+#グリッドの全ての点をbackendで実行し、{行名: resultTable}をグリッドの順に返す
+#base_seedを渡すと点ごとのシードを番号から決めるので、並列数によらず同じ結果になる
+#sink(ResultSink)を渡すと1点終わるごとに書き出し、すでに書き出してある点は実行しない
+def RunSweep(edges, Group, backend, grid, fixed=None, workers=None, max_concurrency=4, base_seed=None, on_result=None, sink=None):
+    fixed = dict(fixed or {})
+    tasks = [(PointKey(point), point, None if base_seed is None else base_seed + k)
+             for k, point in enumerate(grid)]
+
+    Result = {}
+    if sink is not None:
+        Result.update({key: sink.results[key] for key, point, seed in tasks if sink.IsCompleted(key)})
+        tasks = [task for task in tasks if not sink.IsCompleted(task[0])]
+
+    def collect(key, point, resultTable):
+        Result[key] = resultTable
+        if sink is not None:
+            sink.Write(key, point, resultTable)
+        if on_result is not None:
+            on_result(key, point, resultTable)
+
+    if GetBackend(backend)['remote']:
+        asyncio.run(_RunRemote(edges, Group, backend, tasks, fixed, max_concurrency, collect))
+    else:
+        _RunLocal(edges, Group, backend, tasks, fixed, workers, collect)
+
+    return {key: Result[key] for key in map(PointKey, grid)}
+
+#出力ファイルの名前 問題、バックエンド、スイープした軸から決める
+def SweepName(fileName, backend, axes):
+    return '_'.join([fileName, backend, *axes])
+
+#output/{name}.jsonl に1点ずつ追記するResultSink 同じ名前で実行し直すと続きから始まる
+def OpenSink(name, fileName, backend, fixed=None):
+    return ResultSink(f'output/{name}.jsonl', {'instance': fileName, 'backend': backend, 'fixed': dict(fixed or {})})
+
+def ExportResult(Result, filename):
+    df = pd.DataFrame.from_dict(Result)
+    df = df.T
+    path = f'output/{filename}.json'
+    df.to_json(path)
+    print(df)
+
+#コマンドラインの軸の指定 'start:stop:step'(整数のrange) または '4,8,16' のようなカンマ区切り
+def ParseAxis(text):
+    def number(value):
+        return float(value) if '.' in value or 'e' in value else int(value)
+    if ':' in text:
+        return range(*(int(value) for value in text.split(':')))
+    return [number(value) for value in text.split(',')]
+
+def Main(fileName, backend, axes, workers=None):
+    edges, Group = ImportImputJSON(fileName, quiet=True)
+
+    grid = SweepGrid(**axes)
+    name = SweepName(fileName, backend, axes)
+    with OpenSink(name, fileName, backend) as sink:
+        Result = RunSweep(edges, Group, backend, grid, workers=workers, base_seed=0, sink=sink,
+                          on_result=lambda key, point, resultTable: print(key))
+
+    ExportResult(Result, name)
+
+#python qa/SweepEngine.py ChengRW100 sqa num_sweeps=10:301:10 trotter=4,8 のように問題、バックエンド、軸を指定する
+if __name__ == "__main__":
+    import sys
+    axes = dict(arg.split('=', 1) for arg in sys.argv[3:])
+    Main(sys.argv[1], sys.argv[2], {name: ParseAxis(text) for name, text in axes.items()})
@@ -0,0 +1,40 @@
+from qiskit import QuantumCircuit, transpile
+from qiskit.circuit import ParameterVector
+
+
+# (問題, レイヤー数, バックエンド)ごとのトランスパイル済み回路
+_templates = {}
+
+# β、γをシンボルのままにしたQAOA回路を作る
+def build_qaoa_template(columns, nqubits, n_layers, measure=True):
+    beta = ParameterVector('β', n_layers)
+    gamma = ParameterVector('γ', n_layers)
+
+    qc = QuantumCircuit(nqubits)
+    qc.h(range(nqubits))
+
+    for layer_index in range(n_layers):
+        for pair in columns:
+            qc.rzz(gamma[layer_index], pair[0], pair[1])
+        for qubit in range(nqubits):
+            qc.rx(2 * beta[layer_index], qubit)
+
+    # 状態ベクトルを直接使う場合は測定を付けない
+    if measure:
+        qc.measure_all()
+    return qc, list(beta) + list(gamma)
+
+# 回路の作成とトランスパイルは最初の一回だけ行い、以降はキャッシュを返す
+def get_qaoa_template(columns, nqubits, n_layers, backend, measure=True):
+    key = (tuple(tuple(pair) for pair in columns), nqubits, n_layers, backend.name, measure)
+    if key not in _templates:
+        qc, parameters = build_qaoa_template(columns, nqubits, n_layers, measure)
+        _templates[key] = (transpile(qc, backend), parameters)
+    return _templates[key]
+
+# theta = [β..., γ...] をテンプレートに代入して実行できる回路にする
+# Rzzをかけるペアがない場合、γは回路に出てこないので代入しない
+def bind_qaoa_circ(template, theta):
+    circuit, parameters = template
+    present = set(circuit.parameters)
+    return circuit.assign_parameters({parameter: value for parameter, value in zip(parameters, theta) if parameter in present})
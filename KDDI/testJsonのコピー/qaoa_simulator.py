@@ -0,0 +1,130 @@
+import numpy as np
+
+
+# H → (Rzz × column) → (Rx × 全量子ビット) の構造に特化したQAOAの状態ベクトルシミュレータ
+# 状態ベクトルのインデックスのjビット目をj番目の量子ビットとする(Qiskitと同じ順番)
+# phaseを渡すと、columnsのRzzの代わりに exp(-iγ phase) をコスト層にする
+class QAOASimulator:
+
+    def __init__(self, columns, nqubits, cost, phase=None):
+        self.nqubits = nqubits
+        self.dim = 2 ** nqubits
+        self.cost = np.asarray(cost, dtype=np.float64)
+
+        if phase is not None:
+            self.phase = np.asarray(phase, dtype=np.float64)
+        else:
+            # rzz(γ) = exp(-iγ/2 Z_a Z_b) なので、コスト層は Σ z_a z_b / 2 を位相にした対角行列になる
+            states = np.arange(self.dim, dtype=np.int64)
+            zz = np.zeros(self.dim, dtype=np.float64)
+            for a, b in columns:
+                zz += (1 - 2 * ((states >> a) & 1)) * (1 - 2 * ((states >> b) & 1))
+            self.phase = zz / 2
+        # 位相の値は数種類しかないので、expは値の種類ごとに一度だけ計算する
+        self.levels, self.level_index = np.unique(self.phase, return_inverse=True)
+
+    # exp(-iγ phase) を状態ベクトルにかける
+    def _apply_cost(self, psi, gamma):
+        psi *= np.exp(-1j * gamma * self.levels)[self.level_index]
+
+    # rx(2β)を全ての量子ビットにかける(量子ビットごとのバタフライ演算)
+    def _apply_mixer(self, psi, beta):
+        c = np.cos(beta)
+        s = -1j * np.sin(beta)
+        for qubit in range(self.nqubits):
+            view = psi.reshape(-1, 2, 2 ** qubit)
+            zero = view[:, 0, :].copy()
+            view[:, 0, :] = c * zero + s * view[:, 1, :]
+            view[:, 1, :] = s * zero + c * view[:, 1, :]
+
+    # Σ_j X_j ψ (ミキサーの生成子をかけたもの)
+    def _apply_x_sum(self, psi):
+        out = np.zeros_like(psi)
+        for qubit in range(self.nqubits):
+            view = psi.reshape(-1, 2, 2 ** qubit)
+            out_view = out.reshape(-1, 2, 2 ** qubit)
+            out_view[:, 0, :] += view[:, 1, :]
+            out_view[:, 1, :] += view[:, 0, :]
+        return out
+
+    def statevector(self, theta):
+        n_layers = len(theta)//2
+        beta = theta[:n_layers]
+        gamma = theta[n_layers:]
+
+        psi = np.full(self.dim, 1 / np.sqrt(self.dim), dtype=np.complex128)
+        for layer_index in range(n_layers):
+            self._apply_cost(psi, gamma[layer_index])
+            self._apply_mixer(psi, beta[layer_index])
+        return psi
+
+    # 複数のthetaをまとめてシミュレーションする(状態ベクトルは バッチ数 x 2^n)
+    def statevectors(self, thetas):
+        thetas = np.atleast_2d(np.asarray(thetas, dtype=np.float64))
+        n_layers = thetas.shape[1]//2
+        beta = thetas[:, :n_layers]
+        gamma = thetas[:, n_layers:]
+
+        psi = np.full((len(thetas), self.dim), 1 / np.sqrt(self.dim), dtype=np.complex128)
+        for layer_index in range(n_layers):
+            psi *= np.exp(-1j * np.outer(gamma[:, layer_index], self.levels))[:, self.level_index]
+
+            c = np.cos(beta[:, layer_index])[:, None, None]
+            s = -1j * np.sin(beta[:, layer_index])[:, None, None]
+            for qubit in range(self.nqubits):
+                view = psi.reshape(len(thetas), -1, 2, 2 ** qubit)
+                zero = view[:, :, 0, :].copy()
+                view[:, :, 0, :] = c * zero + s * view[:, :, 1, :]
+                view[:, :, 1, :] = s * zero + c * view[:, :, 1, :]
+        return psi
+
+    # 一度に持つ振幅の数がmax_amplitudesを超えないようにバッチを分けて期待値を求める
+    # (大きくしすぎるとキャッシュに載らず、1つずつ計算するより遅くなる)
+    def expectations(self, thetas, max_amplitudes=2 ** 18):
+        thetas = np.atleast_2d(np.asarray(thetas, dtype=np.float64))
+        chunk = max(1, max_amplitudes // self.dim)
+        values = np.empty(len(thetas), dtype=np.float64)
+        for start in range(0, len(thetas), chunk):
+            probs = np.abs(self.statevectors(thetas[start:start + chunk])) ** 2
+            values[start:start + chunk] = (probs @ self.cost) / probs.sum(axis=1)
+        return values
+
+    def probabilities(self, theta):
+        probs = np.abs(self.statevector(theta)) ** 2
+        return probs / probs.sum()
+
+    def expectation(self, theta):
+        return float(self.probabilities(theta) @ self.cost)
+
+    # 期待値 <ψ|C|ψ> と、全てのβ、γについての厳密な勾配を随伴法(adjoint)で求める
+    # 順方向に一度ψを作り、λ = Cψ と一緒に層を逆にたどりながら
+    #   ∂E/∂β_k = 2 Im<λ|B|ψ>  (B = Σ X_j)、 ∂E/∂γ_k = 2 Im<λ|P|ψ>  (P = コスト層の位相)
+    # を集める 計算量は順方向のシミュレーション2回分程度で、パラメータの数によらない
+    def expectation_and_gradient(self, theta):
+        theta = np.asarray(theta, dtype=np.float64)
+        n_layers = len(theta)//2
+        beta = theta[:n_layers]
+        gamma = theta[n_layers:]
+
+        psi = self.statevector(theta)
+        lam = self.cost * psi
+        value = float(np.real(np.vdot(psi, lam)))
+
+        gradient = np.empty(2 * n_layers, dtype=np.float64)
+        for layer_index in reversed(range(n_layers)):
+            gradient[layer_index] = 2 * np.imag(np.vdot(lam, self._apply_x_sum(psi)))
+            self._apply_mixer(psi, -beta[layer_index])
+            self._apply_mixer(lam, -beta[layer_index])
+
+            gradient[n_layers + layer_index] = 2 * np.imag(np.vdot(lam, self.phase * psi))
+            self._apply_cost(psi, -gamma[layer_index])
+            self._apply_cost(lam, -gamma[layer_index])
+        return value, gradient
+
+    # Aerのget_counts()と同じ形式(左端が最上位の量子ビット)のcountsを返す
+    def sample_counts(self, theta, shots, seed=None):
+        rng = np.random.default_rng(seed)
+        samples = rng.choice(self.dim, size=shots, p=self.probabilities(theta))
+        states, occurrences = np.unique(samples, return_counts=True)
+        return {format(state, f'0{self.nqubits}b'): int(count)
+                for state, count in zip(states, occurrences)}
@@ -0,0 +1,88 @@
+import math
+import numpy as np
+import scipy.optimize
+from qiskit import Aer
+from QAOA import create_qaoa_circ
+from feasible_encoding import create_encoded_qaoa_circ, encoded_mps_simulator
+from instance import as_group_index
+from objective import evaluate_counts, get_objective_cache
+from mps_simulator import MPSSimulator, MPS_MAX_BOND, MPS_CUTOFF
+
+
+# theta と ショット数 を受け取り、(目的関数値の平均, 1ショットあたりの分散) を返す関数を作る
+# 評価ごとのシードはseedから作る乱数列で決める max_bondとcutoffはmethod='mps'の時のMPSの設定
+# encoding(feasible_encoding.PairEncoding)を渡すと符号化した回路でサンプルし、countsを変数のビット列に戻してから評価する
+# threadsはAerのスレッド数(Noneなら0を渡してAerに任せる)
+def get_sampled_objective(columns, Gce, method='qasm', seed=None, max_bond=MPS_MAX_BOND, cutoff=MPS_CUTOFF, encoding=None, threads=None):
+    rng = np.random.default_rng(seed)
+    cache = get_objective_cache(Gce)
+    if method == 'mps' and encoding is not None:
+        simulator = encoded_mps_simulator(encoding, Gce, max_bond, cutoff)
+        sample = lambda theta, shots: encoding.decode_counts(simulator.sample_counts(theta, shots, seed=int(rng.integers(2 ** 31))))
+    elif method == 'mps':
+        simulator = MPSSimulator(columns, as_group_index(Gce).num_vars, max_bond, cutoff)
+        sample = lambda theta, shots: simulator.sample_counts(theta, shots, seed=int(rng.integers(2 ** 31)))
+    elif encoding is not None:
+        backend = Aer.get_backend('qasm_simulator')
+        sample = lambda theta, shots: encoding.decode_counts(
+            backend.run(create_encoded_qaoa_circ(encoding, Gce, theta, backend),
+                        seed_simulator=int(rng.integers(2 ** 31)), shots=shots,
+                        max_parallel_threads=threads or 0).result().get_counts())
+    else:
+        backend = Aer.get_backend('qasm_simulator')
+        sample = lambda theta, shots: backend.run(create_qaoa_circ(columns, Gce, theta, backend),
+                                                  seed_simulator=int(rng.integers(2 ** 31)), shots=shots,
+                                                  max_parallel_threads=threads or 0).result().get_counts()
+
+    def objective(theta, shots):
+        counts = sample(theta, shots)
+        objectives, expectation, _ = evaluate_counts(counts, Gce, cache)
+        occurrences = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        variance = float(((objectives - expectation) ** 2) @ occurrences) / occurrences.sum()
+        return expectation, variance
+
+    return objective
+
+# COBYLAの信頼半径(rho)を段階的に小さくしながら、段階ごとにショット数を増やして最適化する
+# 半径rhoの段階では、期待値の標準誤差が半径に比例して小さくなるよう shots = min_shots * (rhobeg/rho)^2 にする
+# target_errorを渡すと、直前の評価の分散からその標準誤差に届くショット数で頭打ちにする(分散の小さい所では増やさない)
+# maxiterは全段階を合わせた評価回数の上限 結果には使ったショット数の合計(shots)と段階ごとの内訳(schedule)を入れる
+def optimize_with_schedule(sampled_objective, x0, maxiter, min_shots=64, max_shots=4096, rhobeg=0.5, rhoend=0.05, stages=4, target_error=None):
+    radii = rhobeg * (rhoend/rhobeg) ** (np.arange(stages + 1)/stages)
+    state = {'shots': min_shots, 'total': 0, 'variance': None}
+
+    def fun(theta):
+        value, variance = sampled_objective(theta, state['shots'])
+        state['total'] += state['shots']
+        state['variance'] = variance
+        return value
+
+    x = np.asarray(x0, dtype=np.float64)
+    nfev = 0
+    schedule = []
+    res = None
+    for stage in range(stages):
+        # COBYLAは1回の実行で最低len(x)+2回評価するので、残りがそれより少なければ次の段階に進まない
+        if nfev >= maxiter or (stage > 0 and maxiter - nfev < len(x) + 2):
+            break
+        shots = min_shots * (rhobeg/radii[stage]) ** 2
+        if target_error is not None and state['variance'] is not None:
+            shots = min(shots, state['variance']/target_error ** 2)
+        state['shots'] = int(min(max_shots, max(min_shots, math.ceil(shots))))
+
+        res = scipy.optimize.minimize(fun, x, method='COBYLA',
+                                      options={'rhobeg': radii[stage], 'tol': radii[stage + 1], 'maxiter': maxiter - nfev})
+        x = res.x
+        nfev += res.nfev
+        schedule.append({'rho': float(radii[stage]), 'shots': state['shots'], 'nfev': int(res.nfev)})
+
+    # どの段階も実行できなかった(maxiterやstagesが0の)場合は、初期値をmin_shotsで一度だけ評価したものを結果にする
+    if res is None:
+        res = scipy.optimize.OptimizeResult(x=x, fun=fun(x), nit=0, success=False,
+                                            message='no stage was run within maxiter')
+        nfev = 1
+
+    res.nfev = nfev
+    res.shots = state['total']
+    res.schedule = schedule
+    return res
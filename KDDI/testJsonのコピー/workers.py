@@ -0,0 +1,21 @@
+import os
+from contextlib import contextmanager
+
+
+# ワーカーは1スレッドで動かし、プロセス間でCPUを取り合わないようにする
+# spawnした子プロセスはnumpyやAerをimportした時点でスレッド数を決めるので、initializerで設定しても効かない
+# プールがプロセスを起動する間だけ親プロセスの環境変数を1にしておき、終わったら元に戻す
+THREAD_ENVIRONMENT = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+@contextmanager
+def single_threaded_workers():
+    saved = {name: os.environ.get(name) for name in THREAD_ENVIRONMENT}
+    os.environ.update(dict.fromkeys(THREAD_ENVIRONMENT, '1'))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value